@@ -19,8 +19,11 @@ public class ContractTests implements SpecmaticContractTest {
     @BeforeAll
     public static void setUp() {
         // Where your Spring Boot app will run (we’ll start it right here)
+        // -Dcontract.port=... lets parallel runs (e.g. patch validation worktrees) avoid clashing on 8080
+        String port = System.getProperty("contract.port", "8080");
         System.setProperty("host", "localhost");
-        System.setProperty("port", "8080");
+        System.setProperty("port", port);
+        System.setProperty("server.port", port);
 
         // Point Specmatic to your OpenAPI (so it doesn’t rely only on specmatic.yaml discovery)
         System.setProperty("contractPaths", "src/main/resources/openapi/simple-payments.yaml");
@@ -29,9 +32,12 @@ public class ContractTests implements SpecmaticContractTest {
         System.setProperty("SPECMATIC_GENERATIVE_TESTS", "false");
         System.setProperty("SPECMATIC_TEST_PARALLELISM", "auto");
 
-        // (Optional) filter out paths if needed
+        // (Optional) filter out paths if needed; keeps a -Dfilter=... passed in (e.g. the agent's
+        // re-run of only the failing operations) instead of overwriting it
         if (!EXCLUDED_ENDPOINTS.isBlank()) {
-            System.setProperty("filter", String.format("PATH!=%s", EXCLUDED_ENDPOINTS));
+            String exclude = String.format("PATH!=%s", EXCLUDED_ENDPOINTS);
+            String given = System.getProperty("filter", "");
+            System.setProperty("filter", given.isBlank() ? exclude : "(" + given + ") && " + exclude);
         }
 
         // Start your Spring Boot app for the duration of the tests
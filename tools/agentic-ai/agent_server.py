@@ -0,0 +1,161 @@
+"""
+Long-lived agent for `run.py --serve`: one warm Agent (imports, config, file index, response
+cache, pooled Ollama connections) behind a small local HTTP API, so editor hooks only pay for
+the run itself.
+
+  GET  /health  -> {"status": "ok", "busy": false, "runs": 3, ...}
+  POST /run     -> body {"propose_patches": true, "force_tests": false, "fast": false, "validate": false,
+                         "fan_out": false, "parallel": false, "only_failing": false,
+                         "tiered": false, "retrieve": false, "warm": false,
+                         "loop": false}; returns the run result JSON
+
+Runs are serialized (one Ollama, one working tree); a request that arrives while another run is
+in flight waits for it unless it sends "wait": false, which gets a 409 instead.
+"""
+import json, os, socketserver, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from colorama import Fore, Style
+from agent import Agent
+
+# request fields that map straight onto Agent attributes for the duration of one run
+RUN_OVERRIDES = ("fast", "force_tests", "validate", "fan_out", "parallel", "only_failing", "tiered", "retrieve", "warm")
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects a (host, port) address
+
+class AgentServer:
+    def __init__(self, config_path: str, agent_kwargs: dict = None, host: str = None, port: int = None,
+                 socket_path: str = None, verbose: bool = False):
+        self.config_path = config_path
+        self.agent_kwargs = dict(agent_kwargs or {})
+        self.verbose = verbose
+        self.agent = None
+        self._config_mtime = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.runs = 0
+        self.started = time.time()
+        self.last_run = None
+        self._load_agent()
+
+        scfg = self.agent.cfg.get("serve", {}) or {}
+        self.ping_interval = float(scfg.get("ping_interval", 240))
+        socket_path = socket_path or scfg.get("socket") or ""
+        handler = self._handler()
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)  # stale socket from a previous daemon
+            self.server = _UnixHTTPServer(socket_path, handler)
+            self.address = f"unix:{socket_path}"
+        else:
+            self.server = ThreadingHTTPServer((host or scfg.get("host", "127.0.0.1"),
+                                               int(port or scfg.get("port", 8765))), handler)
+            self.server.daemon_threads = True
+            h, p = self.server.server_address[:2]
+            self.address = f"http://{h}:{p}"
+
+    def _load_agent(self):
+        """(Re)builds the Agent only when config.yaml changed since it was last read."""
+        mtime = os.path.getmtime(self.config_path)
+        if self.agent is None or mtime != self._config_mtime:
+            if self.agent is not None:
+                print(Fore.CYAN + ">> config changed; reloading agent" + Style.RESET_ALL)
+            self.agent = Agent(self.config_path, **self.agent_kwargs)
+            self._config_mtime = mtime
+
+    def _keep_models_warm(self):
+        """Pings planner/coder right away (loads them), then every ping_interval seconds."""
+        while True:
+            if not self._run_lock.locked():  # a run keeps them loaded by itself
+                client = self.agent.client  # re-read: a config reload may have swapped models
+                for role in ("planner_model", "coder_model"):
+                    ok = client.ping(role)
+                    if self.verbose or not ok:
+                        print(f"[DEBUG] keep-alive {client.models[role]}: {'ok' if ok else 'failed'}")
+            if self._stop.wait(self.ping_interval):
+                return
+
+    def run(self, req: dict) -> dict:
+        with self._run_lock:
+            self._load_agent()
+            agent = self.agent
+            saved = {k: getattr(agent, k) for k in RUN_OVERRIDES}
+            try:
+                for k in RUN_OVERRIDES:
+                    if req.get(k) is not None:
+                        setattr(agent, k, bool(req[k]))
+                t0 = time.time()
+                if req.get("loop"):
+                    result = agent.run_loop(max_iterations=req.get("max_iterations"),
+                                            max_seconds=req.get("max_seconds"), max_tokens=req.get("max_tokens"))
+                else:
+                    result = agent.run_once(propose_patches=bool(req.get("propose_patches", False)))
+                self.runs += 1
+                self.last_run = {"finished": time.time(), "seconds": round(time.time() - t0, 2)}
+                return result
+            finally:
+                for k, v in saved.items():
+                    setattr(agent, k, v)
+
+    def health(self) -> dict:
+        return {"status": "ok", "busy": self._run_lock.locked(), "runs": self.runs,
+                "uptime": round(time.time() - self.started, 1), "lastRun": self.last_run,
+                "models": self.agent.client.models, "cache": self.agent.client.cache_stats()}
+
+    def _handler(self):
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                if srv.verbose:
+                    print("[DEBUG] " + fmt % args)
+
+            def _send(self, code: int, obj):
+                data = json.dumps(obj, indent=2, default=str).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/health":
+                    return self._send(200, srv.health())
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/run":
+                    return self._send(404, {"error": f"unknown path {self.path}"})
+                try:
+                    req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except ValueError as e:
+                    return self._send(400, {"error": f"bad JSON: {e}"})
+                if req.get("wait") is False and srv._run_lock.locked():
+                    return self._send(409, {"error": "a run is already in progress"})
+                try:
+                    self._send(200, srv.run(req))
+                except Exception as e:
+                    self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        return Handler
+
+    def serve_forever(self):
+        if self.ping_interval > 0:
+            threading.Thread(target=self._keep_models_warm, name="keepalive", daemon=True).start()
+        print(Fore.CYAN + f">> Agent serving on {self.address} (POST /run, GET /health)" + Style.RESET_ALL)
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._stop.set()
+        self.server.server_close()
+        if self.address.startswith("unix:") and os.path.exists(self.address[5:]):
+            os.unlink(self.address[5:])
@@ -0,0 +1,541 @@
+"""
+Deterministic spec-vs-code analysis: no model call, milliseconds.
+
+Indexes the OpenAPI operations of the contract specs and the Spring handlers (@RequestMapping +
+@Get/Post/Put/Patch/DeleteMapping, @RequestHeader, @RequestBody DTOs and their bean-validation
+annotations, the statuses each handler can return) and flags the mismatches that account for
+most contract-test failures: success status, required headers, request-field constraints and
+required-ness, response fields, unmapped paths, and 404s on generated path ids.
+
+Each finding says which failures it can explain (e.g. a code constraint stricter than the spec
+turns an expected 2xx into a 400); when every failure cluster is explained the agent can skip
+the LLM stages.
+"""
+import re, time
+from dataclasses import dataclass, field, asdict
+from http import HTTPStatus
+import yaml
+from repo_utils import chunk_java
+
+MAPPINGS = {"GetMapping": "GET", "PostMapping": "POST", "PutMapping": "PUT", "PatchMapping": "PATCH",
+            "DeleteMapping": "DELETE"}
+ANNOTATION = re.compile(r"@(\w+)(?:\s*\(((?:[^()]|\([^()]*\))*)\))?")
+STRING = re.compile(r'"((?:\\.|[^"\\])*)"')
+ENTITY_CALL = re.compile(r"ResponseEntity\s*\.\s*(\w+)\s*\(")
+STATUS_CALL = re.compile(r"\.status\(\s*(?:(\d{3})|HttpStatus\.(\w+))\s*\)")
+NEW_ENTITY = re.compile(r"new\s+ResponseEntity\s*<[^>]*>\s*\([^;]*?HttpStatus\.(\w+)")
+ENTITY_STATUS = {"ok": 200, "created": 201, "accepted": 202, "noContent": 204, "badRequest": 400,
+                 "notFound": 404, "unprocessableEntity": 422, "internalServerError": 500}
+RECORD = re.compile(r"\brecord\s+(\w+)\s*\(")
+CLASS = re.compile(r"\bclass\s+(\w+)")
+FIELD = re.compile(r"^\s*(?:(?:private|protected|public|final)\s+)+([\w.<>,?\[\] ]+?)\s+(\w+)\s*(?:=[^;]*)?;", re.MULTILINE)
+REQUIRED_ANN = {"NotNull", "NotBlank", "NotEmpty"}
+
+def norm_path(path: str) -> str:
+    """/payments/{id} and Specmatic's /payments/(id:string) both become /payments/{}."""
+    p = re.sub(r"\{[^}]*\}|\([^)]*\)", "{}", (path or "").strip())
+    return "/" + p.strip("/") if p.strip("/") else "/"
+
+def _status_code(name: str):
+    try:
+        return HTTPStatus[name].value
+    except KeyError:
+        return None
+
+def _ann_args(args: str) -> dict:
+    """`value = "X", required = false` / `"X"` / `1` -> {"value": ..., "required": ...}."""
+    out = {}
+    for part in re.split(r",(?![^{]*\})", args or ""):
+        if "=" in part and not part.strip().startswith('"'):
+            k, v = part.split("=", 1)
+            out[k.strip()] = v.strip()
+        elif part.strip():
+            out.setdefault("value", part.strip())
+    return out
+
+def _unquote(v: str) -> str:
+    m = STRING.search(v or "")
+    return m.group(1) if m else (v or "").strip()
+
+def _num(v):
+    try:
+        return float(_unquote(str(v)))
+    except (TypeError, ValueError):
+        return None
+
+def _line_at(text: str, pos: int) -> int:
+    return text.count("\n", 0, pos) + 1
+
+# ---------------- index ------------------------------
+
+@dataclass
+class Operation:
+    method: str
+    path: str
+    spec: str
+    line: int
+    headers: dict = field(default_factory=dict)     # lower name -> (name, required)
+    path_params: list = field(default_factory=list)
+    responses: set = field(default_factory=set)
+    request_schema: str = ""
+    response_schemas: dict = field(default_factory=dict)  # status -> schema name
+
+@dataclass
+class Handler:
+    method: str
+    path: str
+    name: str
+    file: str
+    line: int
+    headers: dict = field(default_factory=dict)     # lower name -> (name, required, line)
+    body_type: str = ""
+    statuses: set = field(default_factory=set)
+
+@dataclass
+class DtoField:
+    name: str
+    type: str
+    annotations: dict
+    line: int
+
+@dataclass
+class Dto:
+    name: str
+    file: str
+    fields: dict = field(default_factory=dict)
+
+def index_spec(rel: str, text: str) -> tuple[list[Operation], dict]:
+    """(operations, component schemas) of one OpenAPI document; ([], {}) if it doesn't parse."""
+    try:
+        doc = yaml.safe_load(text) or {}
+    except yaml.YAMLError:
+        return [], {}
+    if not isinstance(doc, dict):
+        return [], {}
+    schemas = ((doc.get("components") or {}).get("schemas")) or {}
+    lines = text.splitlines()
+    ops = []
+    for path, item in (doc.get("paths") or {}).items():
+        if not isinstance(item, dict):
+            continue
+        line = next((i + 1 for i, l in enumerate(lines) if l.strip().startswith(f"{path}:")), 0)
+        shared = item.get("parameters") or []
+        for method, op in item.items():
+            if method.upper() not in MAPPINGS.values() or not isinstance(op, dict):
+                continue
+            o = Operation(method.upper(), path, rel, line)
+            for p in [*shared, *(op.get("parameters") or [])]:
+                p = _resolve(doc, p)
+                if p.get("in") == "header":
+                    o.headers[p["name"].lower()] = (p["name"], bool(p.get("required", False)))
+                elif p.get("in") == "path":
+                    o.path_params.append(p.get("name"))
+            body = ((op.get("requestBody") or {}).get("content") or {}).get("application/json") or {}
+            o.request_schema = _ref_name((body.get("schema") or {}))
+            for code, resp in (op.get("responses") or {}).items():
+                if str(code).isdigit():
+                    o.responses.add(int(code))
+                    content = ((resp or {}).get("content") or {}).get("application/json") or {}
+                    name = _ref_name(content.get("schema") or {})
+                    if name:
+                        o.response_schemas[int(code)] = name
+            ops.append(o)
+    return ops, schemas
+
+def _resolve(doc: dict, node):
+    ref = (node or {}).get("$ref") if isinstance(node, dict) else None
+    if not ref or not ref.startswith("#/"):
+        return node or {}
+    for part in ref[2:].split("/"):
+        doc = (doc or {}).get(part) or {}
+    return doc
+
+def _ref_name(schema: dict) -> str:
+    ref = schema.get("$ref", "") if isinstance(schema, dict) else ""
+    return ref.rsplit("/", 1)[-1] if ref else ""
+
+def _handler_statuses(body: str) -> set:
+    out = {ENTITY_STATUS[m] for m in ENTITY_CALL.findall(body) if m in ENTITY_STATUS}
+    for num, name in STATUS_CALL.findall(body):
+        code = int(num) if num else _status_code(name)
+        if code:
+            out.add(code)
+    out |= {c for c in map(_status_code, NEW_ENTITY.findall(body)) if c}
+    return out
+
+def _body_start(chunk: str) -> int:
+    """Offset of a method chunk's opening brace (outside string literals and annotation parens)."""
+    masked = STRING.sub(lambda m: '"' + "_" * (len(m.group(0)) - 2) + '"', chunk)
+    start = masked.find("\n") + 1 if masked.startswith("// in ") else 0
+    depth = 0
+    for i in range(start, len(masked)):
+        c = masked[i]
+        depth += {"(": 1, ")": -1}.get(c, 0)
+        if c == "{" and depth == 0:
+            return i
+    return len(chunk)
+
+def index_java(rel: str, text: str) -> tuple[list[Handler], list[Dto], set]:
+    """(handlers, DTOs, statuses set by @RestControllerAdvice handlers) of one Java file."""
+    handlers, dtos, advice = [], [], set()
+    cls = CLASS.search(text)
+    head = text[:cls.start()] if cls else ""
+    anns = {n: a for n, a in ANNOTATION.findall(head)}
+    prefix = _unquote(_ann_args(anns["RequestMapping"]).get("value", _ann_args(anns["RequestMapping"]).get("path", ""))) \
+        if "RequestMapping" in anns else ""
+    is_advice = "RestControllerAdvice" in anns or "ControllerAdvice" in anns
+
+    for chunk in chunk_java(rel, text):
+        if chunk["title"].endswith("(outline)"):
+            continue
+        body = chunk["text"]
+        signature = body[:_body_start(body)]
+        method_anns = ANNOTATION.findall(signature)
+        statuses = _handler_statuses(body)
+        for n, a in method_anns:
+            if n == "ResponseStatus":
+                args = _ann_args(a)
+                code = _status_code((args.get("code") or args.get("value") or "").split(".")[-1])
+                if code:
+                    statuses.add(code)
+        if is_advice:
+            advice |= statuses
+            continue
+        mapping = next(((n, a) for n, a in method_anns if n in MAPPINGS or n == "RequestMapping"), None)
+        if not mapping:
+            continue
+        n, a = mapping
+        args = _ann_args(a)
+        sub = _unquote(args.get("value") or args.get("path") or "")
+        verb = MAPPINGS.get(n) or (re.search(r"RequestMethod\.(\w+)", a or "") or [None, "GET"])[1]
+        ret = re.search(r"(?:public|protected|private)?\s*([\w.<>?,\[\] ]+?)\s+\w+\s*\(", signature.split("\n", 1)[-1])
+        if not statuses:
+            statuses = {200}  # plain return value / void
+        elif ret and not ret.group(1).strip().startswith("ResponseEntity") and not statuses & set(range(200, 300)):
+            statuses.add(200)
+        h = Handler(verb, "/" + "/".join(s.strip("/") for s in (prefix, sub) if s.strip("/")), chunk["title"],
+                    rel, chunk["start"], statuses=statuses)
+        for m in re.finditer(r"@RequestHeader(?:\s*\(([^)]*)\))?\s+(?:final\s+)?[\w.<>]+\s+(\w+)", signature):
+            hargs = _ann_args(m.group(1) or "")
+            name = _unquote(hargs.get("value") or hargs.get("name") or "") or m.group(2)
+            required = hargs.get("required", "true").strip() != "false" and "defaultValue" not in hargs
+            h.headers[name.lower()] = (name, required, chunk["start"] + signature[:m.start()].count("\n") - 1)
+        body_m = re.search(r"@RequestBody\s+(?:@\w+(?:\([^)]*\))?\s+)*([\w.]+)", signature)
+        if body_m:
+            h.body_type = body_m.group(1).split(".")[-1]
+        handlers.append(h)
+
+    for m in RECORD.finditer(text):
+        depth, i = 1, m.end()
+        while i < len(text) and depth:
+            depth += {"(": 1, ")": -1}.get(text[i], 0)
+            i += 1
+        dto = Dto(m.group(1), rel)
+        comps, depth, start = [], 0, m.end()
+        for j in range(m.end(), i - 1):
+            c = text[j]
+            depth += {"(": 1, ")": -1, "<": 1, ">": -1}.get(c, 0)
+            if c == "," and depth == 0:
+                comps.append((start, j))
+                start = j + 1
+        comps.append((start, i - 1))
+        for s, e in comps:
+            _add_field(dto, text, s, text[s:e])
+        dtos.append(dto)
+    if cls and not RECORD.search(text) and not handlers:
+        dto = Dto(cls.group(1), rel)
+        for fm in FIELD.finditer(text):
+            pre = text[text.rfind(";", 0, fm.start()) + 1:fm.start()]
+            pre = pre[pre.rfind("}") + 1:]
+            _add_field(dto, text, fm.start(), pre + " " + f"{fm.group(1)} {fm.group(2)}")
+        if dto.fields:
+            dtos.append(dto)
+    return handlers, dtos, advice
+
+def _add_field(dto: Dto, text: str, pos: int, decl: str):
+    decl = re.sub(r"//.*", "", decl).strip()
+    anns = {n: a for n, a in ANNOTATION.findall(decl)}
+    bare = ANNOTATION.sub("", decl).split()
+    if len(bare) >= 2:
+        name = bare[-1]
+        dto.fields[name] = DtoField(name, bare[-2], anns, _line_at(text, pos + len(text[pos:]) - len(text[pos:].lstrip())))
+
+# ---------------- findings ------------------------------
+
+# what a finding does to test outcomes, i.e. which (expected, actual) failures it explains
+REJECTS_VALID = "rejects-valid"        # code answers 400 where the spec expects success
+ACCEPTS_INVALID = "accepts-invalid"    # code answers success where the spec expects 400
+WRONG_SUCCESS = "wrong-success"        # both succeed, with different 2xx codes
+MISSING_HANDLER = "missing-handler"    # nothing mapped: 404/405
+NOT_FOUND_DATA = "not-found-data"      # generated path ids don't exist: 404
+RESPONSE_BODY = "response-body"        # status right, body doesn't match the schema
+INFO = "info"                          # drift worth knowing, explains no failure
+
+@dataclass
+class Finding:
+    kind: str            # status | header | constraint | required | field | path | test-data
+    effect: str
+    endpoint: str        # "POST /payments" (spec path)
+    detail: str
+    fix: str
+    file: str = ""
+    line: int = 0
+    expected: int = None
+    actual: int = None
+    subject: str = ""    # request field/header the finding is about
+    absent: bool = False # it bites requests that lack the subject (required-ness) rather than send it
+
+    def explains(self, method: str, path: str, expected, actual, requests: list = ()) -> bool:
+        """requests: the failing requests as Specmatic printed them; field/header findings need one that fits."""
+        if f"{method} {norm_path(path)}" != f"{self.endpoint.split(' ')[0]} {norm_path(self.endpoint.split(' ', 1)[-1])}":
+            return False
+        ok2 = lambda s: s is not None and 200 <= s < 300
+        if self.effect == REJECTS_VALID:
+            return ok2(expected) and actual in (400, 422) and self.matches(requests)
+        if self.effect == ACCEPTS_INVALID:
+            return expected in (400, 422) and ok2(actual) and self.matches(requests)
+        if self.effect == WRONG_SUCCESS:
+            return expected == self.expected and actual == self.actual
+        if self.effect == MISSING_HANDLER:
+            return actual in (404, 405)
+        if self.effect == NOT_FOUND_DATA:
+            return ok2(expected) and actual == 404
+        if self.effect == RESPONSE_BODY:
+            return expected is None or expected == actual
+        return False
+
+    def matches(self, requests: list) -> bool:
+        """Some failing request sends (or, if absent, omits) the subject as a JSON key or header line."""
+        if not self.subject:
+            return True
+        name = re.escape(self.subject)
+        sent = re.compile(rf'"{name}"\s*:|^\s*{name}\s*:', re.IGNORECASE | re.MULTILINE)
+        return any(bool(sent.search(r)) != self.absent for r in requests if r)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def _range_rules(f: DtoField) -> dict:
+    a = f.annotations
+    out = {}
+    for key, names in (("min", ("Min", "DecimalMin")), ("max", ("Max", "DecimalMax"))):
+        for n in names:
+            if n in a:
+                out[key] = (_num(_ann_args(a[n]).get("value")), f"@{n}({a[n]})")
+    if "Positive" in a:
+        out.setdefault("min", (0.0, "@Positive"))
+    if "Size" in a:
+        args = _ann_args(a["Size"])
+        if "min" in args:
+            out["minLength"] = (_num(args["min"]), f"@Size({a['Size']})")
+        if "max" in args:
+            out["maxLength"] = (_num(args["max"]), f"@Size({a['Size']})")
+    return out
+
+def _compare_dto(op: Operation, ep: str, schema: dict, dto: Dto, findings: list):
+    props = schema.get("properties") or {}
+    required = set(schema.get("required") or [])
+    where = f"{dto.name}"
+    for name, f in dto.fields.items():
+        code_req = bool(REQUIRED_ANN & set(f.annotations))
+        if name not in props:
+            if code_req:
+                findings.append(Finding("field", REJECTS_VALID, ep, f"{where}.{name} is required in code but not in the "
+                                        f"{op.request_schema} schema", f"drop @{'/@'.join(REQUIRED_ANN & set(f.annotations))} "
+                                        f"from {where}.{name} or add it to the spec", dto.file, f.line,
+                                        subject=name, absent=True))
+            continue
+        spec_req = name in required
+        if code_req and not spec_req:
+            findings.append(Finding("required", REJECTS_VALID, ep, f"{where}.{name} is optional in the spec but "
+                                    f"{'/'.join('@' + a for a in REQUIRED_ANN & set(f.annotations))} in code",
+                                    f"remove the annotation or add {name} to required: in {op.request_schema}",
+                                    dto.file, f.line, subject=name, absent=True))
+        elif spec_req and not code_req:
+            findings.append(Finding("required", ACCEPTS_INVALID, ep, f"{where}.{name} is required in the spec but not "
+                                    f"validated in code", f"add @NotNull to {where}.{name}", dto.file, f.line,
+                                    subject=name, absent=True))
+        p = props[name] or {}
+        rules = _range_rules(f)
+        for spec_key, code_key, stricter in (("minimum", "min", lambda c, s: c > s), ("maximum", "max", lambda c, s: c < s),
+                                             ("minLength", "minLength", lambda c, s: c > s),
+                                             ("maxLength", "maxLength", lambda c, s: c < s)):
+            s = _num(p.get(spec_key)) if spec_key in p else None
+            c, ann = rules.get(code_key, (None, ""))
+            if s is None and c is None:
+                continue
+            if c is not None and (s is None or stricter(c, s)):
+                spec_txt = f"{spec_key}: {p[spec_key]}" if s is not None else f"no {spec_key}"
+                suggestion = (f'use @DecimalMin("{p[spec_key]}")' if code_key == "min" and s is not None
+                              else f'use @DecimalMax("{p[spec_key]}")' if code_key == "max" and s is not None
+                              else f"align {ann} with {spec_key}" if s is not None else f"drop {ann}")
+                findings.append(Finding("constraint", REJECTS_VALID, ep, f"{where}.{name}: spec has {spec_txt}, code "
+                                        f"{ann} rejects values the spec allows",
+                                        f"{suggestion} on {where}.{name} (or change the spec if {ann} is the real rule)",
+                                        dto.file, f.line, subject=name))
+            elif s is not None and (c is None or stricter(s, c)):
+                findings.append(Finding("constraint", ACCEPTS_INVALID, ep, f"{where}.{name}: spec has {spec_key}: "
+                                        f"{p[spec_key]}, code {ann or 'has no matching check'}",
+                                        f"add a {spec_key} check for {where}.{name}", dto.file, f.line, subject=name))
+
+def analyze(spec_files: list, java_files: list, contract_specs: list = None) -> "Analysis":
+    """spec_files/java_files: (rel path, content); contract_specs limits the specs to those Specmatic tests."""
+    t0 = time.perf_counter()
+    if contract_specs and not any(rel in contract_specs for rel, _ in spec_files):
+        contract_specs = None  # contracts come from elsewhere (git/registry): use the local specs
+    ops, schemas = [], {}
+    for rel, text in spec_files:
+        if contract_specs and rel not in contract_specs:
+            continue
+        o, s = index_spec(rel, text)
+        ops += o
+        schemas.update(s)
+    handlers, dtos, advice = [], {}, set()
+    for rel, text in java_files:
+        if not rel.endswith(".java"):
+            continue
+        h, d, a = index_java(rel, text)
+        handlers += h
+        dtos.update({x.name: x for x in d})
+        advice |= a
+
+    by_key = {(h.method, norm_path(h.path)): h for h in handlers}
+    findings = []
+    for op in ops:
+        ep = f"{op.method} {op.path}"
+        h = by_key.get((op.method, norm_path(op.path)))
+        if h is None:
+            findings.append(Finding("path", MISSING_HANDLER, ep, f"no Spring handler maps {ep} (spec {op.spec}:{op.line})",
+                                    f"add @{next(k for k, v in MAPPINGS.items() if v == op.method)} for {op.path}",
+                                    op.spec, op.line))
+            continue
+
+        spec_ok = sorted(s for s in op.responses if 200 <= s < 300)
+        code_ok = sorted(s for s in h.statuses if 200 <= s < 300)
+        if spec_ok and code_ok and not set(spec_ok) & set(code_ok):
+            findings.append(Finding("status", WRONG_SUCCESS, ep, f"{h.name} returns {code_ok[0]}, spec declares {spec_ok[0]}",
+                                    f"return {spec_ok[0]} from {h.name} (e.g. ResponseEntity.status({spec_ok[0]}))",
+                                    h.file, h.line, expected=spec_ok[0], actual=code_ok[0]))
+        for s in sorted(h.statuses - op.responses):
+            if s >= 300:
+                findings.append(Finding("status", INFO, ep, f"{h.name} can return {s}, which the spec doesn't declare",
+                                        f"declare '{s}' under responses for {ep}", h.file, h.line, actual=s))
+
+        for key, (name, spec_req) in op.headers.items():
+            code = h.headers.get(key)
+            if code is None and spec_req:
+                findings.append(Finding("header", ACCEPTS_INVALID, ep, f"spec requires header {name}; {h.name} doesn't read it",
+                                        f'add @RequestHeader("{name}") to {h.name}', h.file, h.line,
+                                        subject=name, absent=True))
+            elif code and spec_req and not code[1]:
+                findings.append(Finding("header", ACCEPTS_INVALID, ep, f"spec requires header {name}; code has required = false",
+                                        f"make {name} required in {h.name} (or required: false in the spec)", h.file, code[2],
+                                        subject=name, absent=True))
+            elif code and code[1] and not spec_req:
+                findings.append(Finding("header", REJECTS_VALID, ep, f"header {name} is optional in the spec but required in code",
+                                        f"set required = false on {name} in {h.name}", h.file, code[2],
+                                        subject=name, absent=True))
+        for key, (name, required, line) in h.headers.items():
+            if key not in op.headers and required:
+                findings.append(Finding("header", REJECTS_VALID, ep, f"{h.name} requires header {name}, which the spec doesn't define",
+                                        f"set required = false on {name} or add it to the spec", h.file, line,
+                                        subject=name, absent=True))
+
+        if op.request_schema and h.body_type:
+            dto = dtos.get(h.body_type)
+            schema = schemas.get(op.request_schema) or {}
+            if dto and schema:
+                _compare_dto(op, ep, schema, dto, findings)
+
+        for status, name in op.response_schemas.items():
+            dto, schema = dtos.get(name), schemas.get(name) or {}
+            missing = [p for p in schema.get("required") or [] if dto and p not in dto.fields]
+            if missing:
+                findings.append(Finding("field", RESPONSE_BODY, ep, f"{name} lacks required response field(s) "
+                                        f"{', '.join(missing)}", f"add {', '.join(missing)} to {name}", dto.file, 1,
+                                        expected=status))
+
+        if op.path_params and 404 in h.statuses and spec_ok:
+            findings.append(Finding("test-data", NOT_FOUND_DATA, ep, f"{h.name} answers 404 for unknown "
+                                    f"{'/'.join(op.path_params)}; Specmatic generates random values",
+                                    f"add an example for {'/'.join(op.path_params)} that exists (spec examples or a "
+                                    f"Specmatic examples dir) or seed the data the handler looks up",
+                                    op.spec, op.line, expected=spec_ok[0], actual=404))
+
+    spec_keys = {(o.method, norm_path(o.path)) for o in ops}
+    for h in handlers:
+        if ops and (h.method, norm_path(h.path)) not in spec_keys:
+            findings.append(Finding("path", INFO, f"{h.method} {h.path}", f"{h.name} is not in the contract",
+                                    "add it to the spec or drop it", h.file, h.line))
+    return Analysis(findings, operations=len(ops), handlers=len(handlers), seconds=time.perf_counter() - t0)
+
+@dataclass
+class Analysis:
+    findings: list
+    operations: int = 0
+    handlers: int = 0
+    seconds: float = 0.0
+    explained: dict = field(default_factory=dict)    # cluster key -> [finding index]
+    unexplained: list = field(default_factory=list)  # cluster keys
+
+    def explain(self, clusters: list, records: list = ()) -> "Analysis":
+        """
+        Matches failure clusters to the findings that account for them. records: more failures
+        of the same run (e.g. parser.console_failures) whose requests back field/header findings.
+        """
+        self.explained, self.unexplained = {}, []
+        for c in clusters:
+            same = lambda r: (r.method == c.method and norm_path(r.path) == norm_path(c.path)
+                              and r.expected_status == c.expected_status and r.actual_status == c.actual_status)
+            requests = [r.request for r in [c.example, *records] if getattr(r, "request", "") and same(r)]
+            hits = [i for i, f in enumerate(self.findings)
+                    if c.method and f.explains(c.method, c.path, c.expected_status, c.actual_status, requests)]
+            if hits:
+                self.explained[c.key] = hits
+            else:
+                self.unexplained.append(c.key)
+        return self
+
+    @property
+    def fully_explained(self) -> bool:
+        return bool(self.explained) and not self.unexplained
+
+    def to_dict(self) -> dict:
+        return {"operations": self.operations, "handlers": self.handlers, "seconds": round(self.seconds, 4),
+                "fullyExplained": self.fully_explained, "explained": self.explained,
+                "unexplained": self.unexplained, "findings": [f.to_dict() for f in self.findings]}
+
+def render_analysis(a: Analysis, clusters: list) -> str:
+    sb = [f"== Deterministic analysis ({a.operations} operations, {a.handlers} handlers) =="]
+    for c in clusters:
+        label = f"{c.endpoint or c.example.suite} (expected {c.expected_status}, actual {c.actual_status}) x{c.count}"
+        hits = a.explained.get(c.key)
+        sb.append(f"{label}: {'explained' if hits else 'NOT explained'}")
+        for i in hits or []:
+            f = a.findings[i]
+            sb.append(f"  - [{f.kind}] {f.detail} ({f.file}:{f.line})")
+            sb.append(f"    fix: {f.fix}")
+    other = [f for i, f in enumerate(a.findings) if not any(i in v for v in a.explained.values())]
+    if other:
+        sb.append("Other spec/code drift:")
+        sb += [f"  - [{f.kind}] {f.endpoint}: {f.detail} -> {f.fix}" for f in other]
+    return "\n".join(sb) + "\n"
+
+def render_fixes(a: Analysis, java: bool) -> str:
+    """Fixes for the explained failures, code-side (java=True) or spec-side."""
+    used = sorted({i for v in a.explained.values() for i in v})
+    rows = [a.findings[i] for i in used if a.findings[i].file.endswith(".java") == java]
+    return "".join(f"- {f.endpoint}: {f.fix} ({f.file}:{f.line})\n" for f in rows)
+
+def contract_specs(cfg_text: str) -> list[str]:
+    """Spec paths Specmatic tests against, from specmatic.yaml (v1 sources: / v2 contracts:)."""
+    try:
+        doc = yaml.safe_load(cfg_text) or {}
+    except yaml.YAMLError:
+        return []
+    out = []
+    for entry in (doc.get("contracts") or doc.get("sources") or []) if isinstance(doc, dict) else []:
+        for key in ("provides", "test"):
+            for p in (entry or {}).get(key) or []:
+                out.append(p if isinstance(p, str) else (p or {}).get("specs", p))
+    return [p for p in out if isinstance(p, str)]
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import argparse, subprocess, pathlib, shutil, sys
+import argparse, json, subprocess, pathlib, shutil, sys
 
 def run(cmd, cwd):
     p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -13,6 +13,8 @@ def main():
     ap.add_argument("patch_dir", help="Directory containing *.diff")
     ap.add_argument("--branch", default="agentic-patches")
     ap.add_argument("--repo", default="../../")
+    ap.add_argument("--only-validated", action="store_true",
+                    help="Apply only patches that passed validate_patches.py, best first")
     args = ap.parse_args()
 
     repo = pathlib.Path(args.repo).resolve()
@@ -24,7 +26,19 @@ def main():
     # create new branch
     run(["git", "checkout", "-b", args.branch], repo)
 
-    for diff_file in sorted(pathlib.Path(args.patch_dir).glob("*.diff")):
+    diff_files = sorted(pathlib.Path(args.patch_dir).glob("*.diff"))
+    if args.only_validated:
+        vpath = pathlib.Path(args.patch_dir).parent / "validation.json"
+        if not vpath.exists():
+            print(f"No {vpath}; run validate_patches.py first. Aborting.")
+            return 1
+        ranked = json.loads(vpath.read_text(encoding="utf-8"))
+        good = [r["patch"] for r in ranked if r.get("applies") and not r.get("error")
+                and (r.get("fixed") is None or r["fixed"] > 0)]
+        diff_files = [pathlib.Path(args.patch_dir) / name for name in good]
+        print(f"Applying {len(diff_files)} validated patch(es): {', '.join(good) or '-'}")
+
+    for diff_file in diff_files:
         ret, _, err = run(["git", "apply", "--index", str(diff_file)], repo)
         if ret != 0:
             print(f"Failed to apply {diff_file.name}:\n{err}")
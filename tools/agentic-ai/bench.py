@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the agent pipeline. No real model and no Maven: LLM calls go to mock_ollama,
+and the test stage replays the recorded fixtures in bench_fixtures/.
+
+  python bench.py pipeline --runs 5 --latency 0.5 --tokens-per-sec 40 [--parallel]
+  python bench.py parser   --suites 20 --cases 500 --log-mb 50
+  python bench.py context  --files 2000
+  python bench.py all
+"""
+import argparse, contextlib, io, json, pathlib, random, shutil, statistics, sys, tempfile, time, tracemalloc
+from xml.sax.saxutils import quoteattr
+import yaml
+from mock_ollama import MockOllama
+from parser import parse_reports, render_text
+from clustering import cluster_failures, render_clusters
+from repo_utils import FileIndex, collect_files, collect_specs, build_file_index
+from prompts import build_packed_prompts
+
+HERE = pathlib.Path(__file__).resolve().parent
+FIXTURES = HERE / "bench_fixtures"
+
+def _stats(values: list[float]) -> dict:
+    vs = sorted(values)
+    p95 = vs[min(len(vs) - 1, int(round(0.95 * (len(vs) - 1))))]
+    return {"n": len(vs), "mean": round(statistics.mean(vs), 4), "p50": round(statistics.median(vs), 4),
+            "p95": round(p95, 4), "max": round(vs[-1], 4)}
+
+def _timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return out, time.perf_counter() - t0
+
+def _fixture_repo(source_repo: pathlib.Path) -> pathlib.Path:
+    """Temp copy of the service sources + recorded surefire reports."""
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="agentic-bench-"))
+    shutil.copytree(source_repo / "src", tmp / "src")
+    for name in ("pom.xml", "specmatic.yaml"):
+        if (source_repo / name).exists():
+            shutil.copy(source_repo / name, tmp / name)
+    shutil.copytree(FIXTURES / "surefire-reports", tmp / "target" / "surefire-reports")
+    return tmp
+
+# ---------------- pipeline ------------------------------
+
+def bench_pipeline(args, base_cfg: dict) -> dict:
+    from agent import Agent  # imported late so parser/context benches don't pay for it
+
+    mock = MockOllama(latency=args.latency, tokens_per_sec=args.tokens_per_sec).start()
+    repo = _fixture_repo(pathlib.Path(base_cfg.get("repo_root", "../../")).resolve())
+    stdout_fixture = FIXTURES / "test_stdout.txt"
+    cfg = {
+        **{k: base_cfg[k] for k in ("surefire_dir", "specmatic_log", "spec_keyword", "specmatic_config", "limits")
+           if k in base_cfg},
+        "repo_root": str(repo),
+        "output_dir": "bench_out",
+        # replays recorded Maven output instead of running the suite
+        "test_command": [sys.executable, "-c",
+                         f"import sys; sys.stdout.write(open({str(stdout_fixture)!r}).read())"],
+        "ollama": {**base_cfg["ollama"], "base_url": mock.base_url, "max_retries": 0},
+        "cache": {"enabled": False},
+        "analyzer": {"enabled": False},  # it explains the fixtures' failures and would skip the stages being timed
+        "fix_memory": {"enabled": False},
+        "concurrency": {**(base_cfg.get("concurrency") or {}), "enabled": args.parallel},
+    }
+    cfg_path = repo / "bench_config.yaml"
+    cfg_path.write_text(yaml.safe_dump(cfg), encoding="utf-8")
+
+    stages, totals = {}, []
+    try:
+        for _ in range(args.runs):
+            agent = Agent(str(cfg_path), force_tests=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                result, secs = _timed(agent.run_once, propose_patches=True)
+            totals.append(secs)
+            for label, t in result["stageTimings"].items():
+                stages.setdefault(label, []).append(t)
+    finally:
+        mock.stop()
+        shutil.rmtree(repo, ignore_errors=True)
+
+    return {
+        "runs": args.runs, "parallel": args.parallel,
+        "mock": {"latency": args.latency, "tokensPerSec": args.tokens_per_sec, "requests": mock.requests},
+        "total": _stats(totals),
+        "runsPerMinute": round(60 * len(totals) / sum(totals), 2),
+        "stages": {k: _stats(v) for k, v in stages.items()},
+    }
+
+# ---------------- parser ------------------------------
+
+ENDPOINTS = [("POST", "/payments", 201, 400), ("GET", "/payments/(id:string)", 200, 404),
+             ("PUT", "/payments/(id:string)", 200, 500), ("DELETE", "/payments/(id:string)", 204, 405),
+             ("GET", "/refunds", 200, 400)]
+
+def _synthetic_reports(d: pathlib.Path, suites: int, cases: int, fail_ratio: float, log_mb: float):
+    rnd = random.Random(7)
+    d.mkdir(parents=True, exist_ok=True)
+    for s in range(suites):
+        name = f"com.example.bench.Suite{s}"
+        fails = 0
+        with open(d / f"TEST-{name}.xml", "w", encoding="utf-8") as fh:
+            body = []
+            for c in range(cases):
+                if rnd.random() < fail_ratio:
+                    fails += 1
+                    m, p, exp, act = rnd.choice(ENDPOINTS)
+                    msg = (f'Testing scenario "scenario {c}"\nAPI: {m} {p} -> {exp}\n\n  >> RESPONSE.STATUS\n\n'
+                           f'     Expected status {exp}, actual was status {act}')
+                    stack = "\n".join(f"\tat io.specmatic.test.Frame{k}.invoke(Frame.kt:{rnd.randint(1, 999)})"
+                                      for k in range(20))
+                    body.append(f'<testcase name="contractTest()[{c}]"><failure message={quoteattr(msg)} '
+                                f'type="java.lang.AssertionError"><![CDATA[java.lang.AssertionError: \n{msg}\n{stack}]]>'
+                                f'</failure></testcase>')
+                else:
+                    body.append(f'<testcase name="contractTest()[{c}]"/>')
+            fh.write(f'<?xml version="1.0"?>\n<testsuite name="{name}" tests="{cases}" failures="{fails}" errors="0">\n')
+            fh.write("\n".join(body))
+            fh.write("\n</testsuite>\n")
+    line = "2025-08-25T18:59:54 INFO  [main] io.specmatic.core: request/response noise " + "x" * 60 + "\n"
+    with open(d.parent / "specmatic.log", "w", encoding="utf-8") as fh:
+        for i in range(int(log_mb * 1024 * 1024 / len(line))):
+            fh.write(line if i % 5000 else "ERROR something went wrong in scenario\n")
+
+def bench_parser(args) -> dict:
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="agentic-bench-parse-"))
+    try:
+        reports_dir = tmp / "surefire-reports"
+        _, gen_secs = _timed(_synthetic_reports, reports_dir, args.suites, args.cases, args.fail_ratio, args.log_mb)
+        tracemalloc.start()
+        res, parse_secs = _timed(parse_reports, reports_dir, tmp / "specmatic.log")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        clusters, cluster_secs = _timed(cluster_failures, res.failures)
+        text, render_secs = _timed(render_text, res)
+        ctext, crender_secs = _timed(render_clusters, res, clusters)
+        xml_bytes = sum(f.stat().st_size for f in reports_dir.glob("*.xml"))
+        return {
+            "suites": args.suites, "casesPerSuite": args.cases, "failures": len(res.failures),
+            "xmlMB": round(xml_bytes / 2**20, 1), "logMB": args.log_mb, "generateSeconds": round(gen_secs, 2),
+            "parseSeconds": round(parse_secs, 3), "parsePeakMB": round(peak / 2**20, 1),
+            "failuresPerSecond": round(len(res.failures) / parse_secs) if parse_secs else None,
+            "clusterSeconds": round(cluster_secs, 3), "clusters": len(clusters),
+            "renderSeconds": round(render_secs, 3), "renderedChars": len(text),
+            "clusteredRenderSeconds": round(crender_secs, 3), "clusteredChars": len(ctext),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+# ---------------- context ------------------------------
+
+def bench_context(args, base_cfg: dict) -> dict:
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="agentic-bench-ctx-"))
+    try:
+        rnd = random.Random(11)
+        pkg = tmp / "src/main/java/com/example/bench"
+        for i in range(args.files):
+            d = pkg / f"mod{i % 50}"
+            d.mkdir(parents=True, exist_ok=True)
+            methods = "\n".join(f"    public int m{k}() {{ return {rnd.randint(0, 9999)}; }}" for k in range(60))
+            (d / f"Class{i}.java").write_text(f"package com.example.bench.mod{i % 50};\n\npublic class Class{i} {{\n"
+                                              f"{methods}\n}}\n", encoding="utf-8")
+        (tmp / "target/classes").mkdir(parents=True)
+        for i in range(args.files):  # build output that must be pruned, not walked
+            (tmp / "target/classes" / f"C{i}.class").write_bytes(b"\0" * 64)
+        spec_dir = tmp / "src/main/resources/openapi"
+        spec_dir.mkdir(parents=True)
+        shutil.copy(pathlib.Path(base_cfg.get("repo_root", "../../")).resolve()
+                    / "src/main/resources/openapi/payments.yaml", spec_dir / "payments.yaml")
+
+        index = FileIndex(tmp, tmp / "file_index.json")
+        _, cold = _timed(index.refresh)
+        files, collect_cold = _timed(collect_files, tmp, ["src/main/java", "src/main/resources"], index)
+        index.save()
+        warm_index = FileIndex(tmp, tmp / "file_index.json")
+        _, warm = _timed(warm_index.refresh)
+        _, collect_warm = _timed(collect_files, tmp, ["src/main/java", "src/main/resources"], index)
+        specs = collect_specs(tmp, "openapi", index)
+        parsed = render_text(parse_reports(FIXTURES / "surefire-reports", FIXTURES / "none.log"))
+        _, pack = _timed(build_packed_prompts, parsed, files, specs, "", build_file_index(tmp, index=index),
+                         (base_cfg.get("ollama") or {}).get("num_ctx", 4096) - 512)
+        return {
+            "files": args.files, "indexedFiles": len(index.entries),
+            "indexColdSeconds": round(cold, 3), "indexWarmSeconds": round(warm, 3),
+            "collectColdSeconds": round(collect_cold, 3), "collectWarmSeconds": round(collect_warm, 3),
+            "packPromptsSeconds": round(pack, 3),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("suite", choices=["pipeline", "parser", "context", "all"], nargs="?", default="all")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--latency", type=float, default=0.2, help="mock time-to-first-token (s)")
+    ap.add_argument("--tokens-per-sec", type=float, default=200.0)
+    ap.add_argument("--parallel", action="store_true", help="run the LLM stages concurrently")
+    ap.add_argument("--suites", type=int, default=20)
+    ap.add_argument("--cases", type=int, default=500)
+    ap.add_argument("--fail-ratio", type=float, default=0.3)
+    ap.add_argument("--log-mb", type=float, default=20)
+    ap.add_argument("--files", type=int, default=1000)
+    ap.add_argument("--out", help="Also write the JSON report here")
+    args = ap.parse_args()
+
+    with open(args.config, "r") as f:
+        base_cfg = yaml.safe_load(f) or {}
+
+    report = {}
+    if args.suite in ("pipeline", "all"):
+        report["pipeline"] = bench_pipeline(args, base_cfg)
+    if args.suite in ("parser", "all"):
+        report["parser"] = bench_parser(args)
+    if args.suite in ("context", "all"):
+        report["context"] = bench_context(args, base_cfg)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        pathlib.Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
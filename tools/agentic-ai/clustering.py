@@ -0,0 +1,100 @@
+import hashlib, re
+from dataclasses import dataclass, field
+from parser import FailureRecord, ParsedReports, render_log
+
+# bits of a stack frame that differ between otherwise identical failures
+_LINE_NO   = re.compile(r":\d+\)")
+_SYNTH     = re.compile(r"\$\d+|\$lambda\$\d+|lambda\$\w+\$\d+")
+_HEX       = re.compile(r"0x[0-9a-fA-F]+|@[0-9a-fA-F]{4,}")
+_NUMBERS   = re.compile(r"\d+")
+
+@dataclass
+class FailureCluster:
+    key: str
+    method: str
+    path: str
+    expected_status: int
+    actual_status: int
+    exception: str
+    stack_signature: str
+    example: FailureRecord
+    count: int = 0
+    testcases: list[str] = field(default_factory=list)
+    scenarios: list[str] = field(default_factory=list)
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.method} {self.path}".strip()
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key, "endpoint": self.endpoint,
+            "expectedStatus": self.expected_status, "actualStatus": self.actual_status,
+            "exception": self.exception, "stackSignature": self.stack_signature,
+            "count": self.count, "testcases": self.testcases, "scenarios": self.scenarios,
+        }
+
+def normalize_frame(frame: str) -> str:
+    return _HEX.sub("", _SYNTH.sub("", _LINE_NO.sub(")", frame)))
+
+def failure_signature(rec: FailureRecord) -> tuple:
+    """Endpoint + status mismatch + normalized stack; falls back to the message shape for non-HTTP failures."""
+    stack = " | ".join(normalize_frame(f) for f in rec.stack_summary)
+    if rec.method:
+        return (rec.method, rec.path, rec.expected_status, rec.actual_status, rec.exception, stack)
+    first_line = (rec.message or rec.details).strip().splitlines()[:1]
+    return ("", rec.suite, None, None, rec.exception, _NUMBERS.sub("#", first_line[0] if first_line else ""), stack)
+
+def cluster_failures(failures: list[FailureRecord]) -> list[FailureCluster]:
+    """Groups failures by signature; clusters keep first-seen order and the first record as example."""
+    clusters = {}
+    for rec in failures:
+        sig = failure_signature(rec)
+        c = clusters.get(sig)
+        if c is None:
+            key = hashlib.sha1(repr(sig).encode("utf-8")).hexdigest()[:12]
+            c = clusters[sig] = FailureCluster(key=key, method=rec.method, path=rec.path,
+                                               expected_status=rec.expected_status,
+                                               actual_status=rec.actual_status,
+                                               exception=rec.exception,
+                                               stack_signature=sig[-1], example=rec)
+        c.count += 1
+        c.testcases.append(rec.testcase)
+        if rec.scenario and rec.scenario not in c.scenarios:
+            c.scenarios.append(rec.scenario)
+    return list(clusters.values())
+
+def group_by_endpoint(clusters: list[FailureCluster]) -> dict[str, list[FailureCluster]]:
+    """Clusters per failing endpoint ("POST /payments"); non-HTTP failures share one "other" group."""
+    groups = {}
+    for c in clusters:
+        groups.setdefault(c.endpoint or "other", []).append(c)
+    return groups
+
+def render_clusters(res: ParsedReports, clusters: list[FailureCluster], log_chars: int = 4000,
+                    max_testcases: int = 8) -> str:
+    """Prompt text with each distinct failure once: count, affected tests and one representative example."""
+    if not res.found:
+        return f"No surefire dir: {res.surefire_dir}"
+    sb = ["== Parsed Test Results (clustered) =="]
+    for s in res.suites:
+        sb.append(f"Suite: {s.name} | tests={s.tests} failures={s.failures} errors={s.errors}")
+    total = sum(c.count for c in clusters)
+    sb.append(f"{total} failing test(s) in {len(clusters)} distinct cluster(s)")
+    for i, c in enumerate(clusters, 1):
+        head = c.endpoint or c.example.suite
+        if c.expected_status or c.actual_status:
+            head += f" | expected {c.expected_status}, actual {c.actual_status}"
+        sb.append(f"\nCLUSTER {i}: {head} | x{c.count}")
+        shown = ", ".join(c.testcases[:max_testcases])
+        more = f" (+{len(c.testcases) - max_testcases} more)" if len(c.testcases) > max_testcases else ""
+        sb.append(f"  tests: {shown}{more}")
+        if c.scenarios:
+            sb.append(f"  scenarios: {'; '.join(c.scenarios)}")
+        sb.append(f"  EXAMPLE FAIL: {c.example.testcase} : {c.example.message}")
+        if c.example.stack_summary:
+            sb.append("    STACK: " + "\n           ".join(c.example.stack_summary))
+    for e in res.parser_errors:
+        sb.append(f"PARSER_ERROR: {e}")
+    sb.extend(render_log(res, log_chars))
+    return "\n".join(sb)
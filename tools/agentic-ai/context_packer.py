@@ -0,0 +1,94 @@
+import math, re
+
+# rough but safe for code/yaml on llama/qwen tokenizers; override via limits.chars_per_token
+CHARS_PER_TOKEN = 3.5
+
+API_LINE = re.compile(r"API:\s*([A-Z]+)\s+(\S+)\s*->\s*(\d{3})")
+
+MAPPING_FOR = {
+    "GET": "@GetMapping", "POST": "@PostMapping", "PUT": "@PutMapping",
+    "PATCH": "@PatchMapping", "DELETE": "@DeleteMapping",
+}
+
+def estimate_tokens(text: str, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    return math.ceil(len(text or "") / chars_per_token)
+
+def failing_endpoints(parsed: str) -> list[tuple[str, str]]:
+    """(METHOD, path) pairs from Specmatic 'API: POST /payments -> 201' lines, first-seen order."""
+    seen = []
+    for m in API_LINE.finditer(parsed or ""):
+        ep = (m.group(1), m.group(2))
+        if ep not in seen:
+            seen.append(ep)
+    return seen
+
+def _path_words(path: str) -> set[str]:
+    words = set()
+    for seg in path.strip("/").split("/"):
+        if not seg or seg.startswith("{"):
+            continue
+        seg = seg.lower()
+        words.add(seg)
+        if seg.endswith("s") and len(seg) > 3:
+            words.add(seg[:-1])  # payments -> payment
+    return words
+
+def rank_files(files: list[tuple[str, str]], endpoints: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    Orders (rel, content) pairs by relevance to the failing endpoints: files named after the
+    resource, controllers mapping the failing methods, and specs declaring the failing paths
+    come first. Ties keep the original (walk) order.
+    """
+    if not endpoints:
+        return list(files)
+
+    def score(item):
+        rel, content = item
+        name, low = rel.lower(), content.lower()
+        s = 0
+        for method, path in endpoints:
+            for w in _path_words(path):
+                if w in name:
+                    s += 5
+            base = "/" + path.strip("/").split("/")[0] if path.strip("/") else "/"
+            if f'"{base}' in content or f"{path}:" in content:
+                s += 4
+            if MAPPING_FOR.get(method, "~").lower() in low:
+                s += 2
+        if "controller" in name:
+            s += 3
+        return s
+
+    scored = [(score(f), i, f) for i, f in enumerate(files)]
+    return [f for _, _, f in sorted(scored, key=lambda t: (-t[0], t[1]))]
+
+def fit_text(text: str, budget_tokens: int, chars_per_token: float = CHARS_PER_TOKEN,
+             marker: str = "\n...[truncated to fit context]...\n") -> str:
+    """Cuts text to budget, keeping head and tail (stack tops and the last assertion both survive)."""
+    if estimate_tokens(text, chars_per_token) <= budget_tokens:
+        return text
+    keep = max(0, int(budget_tokens * chars_per_token) - len(marker))
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):] if keep else ""
+
+def pack_files(files: list[tuple[str, str]], budget_tokens: int, max_files: int = 60,
+               chars_per_token: float = CHARS_PER_TOKEN, min_partial_tokens: int = 150) -> str:
+    """
+    Packs whole files in the given order until the budget is spent. The first file that
+    doesn't fit is included partially if a useful amount of budget is left; then we stop.
+    """
+    chunks, used = [], 0
+    for rel, content in files[:max_files]:
+        block = f"\n--- FILE: {rel} ---\n{content}\n"
+        cost = estimate_tokens(block, chars_per_token)
+        if used + cost <= budget_tokens:
+            chunks.append(block)
+            used += cost
+            continue
+        left = budget_tokens - used
+        if left >= min_partial_tokens:
+            head = f"\n--- FILE: {rel} (partial) ---\n"
+            chunks.append(head + fit_text(content, left - estimate_tokens(head, chars_per_token),
+                                          chars_per_token) + "\n")
+        break
+    return "".join(chunks)
@@ -1,25 +1,295 @@
 import re
+from pathlib import Path
+from repo_utils import walk_files
 
 BLOCK = re.compile(r"```diff\s+(.*?)```", re.DOTALL | re.IGNORECASE)
-FILE  = re.compile(r"^\-\-\-\s+(a\/.+|\/dev\/null)$", re.MULTILINE)
 
 JAVA_FILE_HEADER = re.compile(r"^\s*//\s*FILE:\s*(.+)$", re.MULTILINE)
 JAVA_BLOCK = re.compile(r"```java\s+(.*?)```", re.DOTALL | re.IGNORECASE)
 
-def extract_unified_diffs(text: str) -> dict[str,str]:
-    out = {}
-    for m in BLOCK.finditer(text or ""):
-        diff = m.group(1).strip()
-        # take the first --- header to infer path
-        fm = FILE.search(diff)
-        path = "patch.diff"
-        if fm:
-            # if it's /dev/null, try to read +++ header
-            plus = re.search(r"^\+\+\+\s+b\/(.+)$", diff, re.MULTILINE)
-            if plus:
-                path = plus.group(1).strip()
-        out[path] = diff
-    return out
+UNKNOWN_PREFIX = "unknown_"  # key of a diff without ---/+++ headers whose file couldn't be located
+GIT_EXTRA = ("index ", "new file mode", "deleted file mode", "old mode", "new mode", "similarity index",
+             "rename from", "rename to", "Binary files")
+
+def is_unknown_path(path: str) -> bool:
+    return path.startswith(UNKNOWN_PREFIX)
+
+def _strip_path(p: str) -> str:
+    p = p.strip().split("\t")[0].strip()  # diff -u appends a tab + timestamp
+    if p.startswith(("a/", "b/")):
+        p = p[2:]
+    return p
+
+def _header_paths(header: str) -> tuple[str, str]:
+    """(old, new) paths from --- / +++ lines; '/dev/null' for a created or deleted file."""
+    old = re.search(r"^---\s+(.+)$", header, re.MULTILINE)
+    new = re.search(r"^\+\+\+\s+(.+)$", header, re.MULTILINE)
+    return (_strip_path(old.group(1)) if old else "", _strip_path(new.group(1)) if new else "")
+
+class DiffStream:
+    """
+    Single-pass, line-based ```diff parser for streamed LLM output.
+
+    feed() only looks at each line once, so a long response costs O(length). A fence holding diffs
+    for several files is split at every ---/+++ header pair, and each file's patch is emitted as soon
+    as the next header or the closing fence arrives. Patches for a file that already came up earlier
+    are merged into it (see merge_file_diffs), and feed() then returns the merged patch, so callers
+    can simply overwrite by path. Every patch goes through repair_diff() (anchored against repo_root if given).
+    """
+
+    def __init__(self, repo_root=None):
+        self.repo_root = repo_root
+        self.partial = ""       # incomplete last line
+        self.in_fence = False
+        self.pending = None     # "--- " line waiting to see whether a "+++ " line follows
+        self.header = None      # (--- line, +++ line) of the file being read
+        self.body = []
+        self.files = {}         # path -> [patch, ...] in arrival order
+        self.merged = {}        # path -> merged patch
+        self.conflicts = []     # (path, patch) overlapping an earlier patch for the same file
+        self.unknown = 0
+
+    def feed(self, piece: str) -> list[tuple[str,str]]:
+        self.partial += piece or ""
+        done = []
+        *lines, self.partial = self.partial.split("\n")
+        for line in lines:
+            self._line(line, done)
+        if self.in_fence and "```" in self.partial:  # closing fence without a newline yet
+            line, self.partial = self.partial, ""
+            self._line(line, done)
+        return done
+
+    def _line(self, line: str, done: list):
+        if not self.in_fence:
+            i = line.lower().find("```diff")
+            if i >= 0 and (len(line) == i + 7 or line[i + 7].isspace()):
+                self.in_fence = True
+                rest = line[i + 7:].strip()
+                if rest:
+                    self._fence_line(rest, done)
+            return
+        if "```" in line:
+            before = line[:line.index("```")]
+            if before.strip():
+                self._fence_line(before, done)
+            self._flush_pending()
+            self._finish(done)
+            self.in_fence = False
+            return
+        self._fence_line(line, done)
+
+    def _fence_line(self, line: str, done: list):
+        line = line.rstrip("\r")
+        if self.pending is not None:
+            minus, self.pending = self.pending, None
+            if line.startswith("+++ ") or line == "+++":
+                self._finish(done)
+                self.header = (minus, line)
+                return
+            self.body.append(minus)  # a removed line that happens to start with "--"
+        if line.startswith("--- "):
+            self.pending = line
+        elif line.startswith("diff --git "):
+            self._finish(done)
+        elif line.startswith(GIT_EXTRA) and not self.body:
+            pass
+        else:
+            self.body.append(line)
+
+    def _flush_pending(self):
+        if self.pending is not None:
+            self.body.append(self.pending)
+            self.pending = None
+
+    def _finish(self, done: list):
+        header, body = self.header, self.body
+        self.header, self.body = None, []
+        while body and not body[-1].strip():
+            body.pop()
+        if not header and not any(HUNK.match(l) for l in body):
+            return  # prose between files, or an empty fence
+        text = repair_diff("\n".join(([*header] if header else []) + body), self.repo_root)
+        path = _diff_path(text)
+        if path is None:
+            self.unknown += 1
+            path = f"{UNKNOWN_PREFIX}{self.unknown}.diff"
+        self.files.setdefault(path, []).append(text)
+        if len(self.files[path]) == 1:
+            self.merged[path] = text
+        else:
+            merged, rejected = merge_file_diffs(self.files[path])
+            self.conflicts.extend((path, d) for d in rejected if d is text)
+            if text in rejected:
+                self.files[path].remove(text)
+                return
+            self.merged[path] = repair_diff(merged, self.repo_root)
+        done.append((path, self.merged[path]))
+
+def _diff_path(diff: str):
+    """Target path: the +++ b/ side, or the --- a/ side for a deleted file; None without headers."""
+    old, new = _header_paths(diff.split("\n@@", 1)[0])
+    if new and new != "/dev/null":
+        return new
+    if old and old != "/dev/null":
+        return old
+    return None
+
+def extract_unified_diffs(text: str, repo_root=None) -> dict[str,str]:
+    """path -> patch for every file touched in any ```diff fence (multi-file fences split, repeats merged)."""
+    stream = DiffStream(repo_root)
+    stream.feed((text or "") + "\n")
+    return dict(stream.merged)
+
+HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+
+def split_hunks(diff: str) -> tuple[str, list[str]]:
+    """(file header lines, [hunk text, ...]) of a single-file unified diff."""
+    starts = [m.start() for m in HUNK.finditer(diff)]
+    if not starts:
+        return diff, []
+    bounds = starts + [len(diff)]
+    return diff[:starts[0]], [diff[bounds[i]:bounds[i + 1]].rstrip("\n") for i in range(len(starts))]
+
+def hunk_range(hunk: str) -> tuple[int, int]:
+    """[start, end) of the old-file lines a hunk touches."""
+    m = HUNK.match(hunk)
+    start, count = int(m.group(1)), int(m.group(2) or 1)
+    return start, start + max(count, 1)
+
+def merge_file_diffs(diffs: list[str]) -> tuple[str, list[str]]:
+    """
+    Merges several diffs for the same file into one: hunks that touch disjoint line ranges
+    are combined (in line order), a hunk overlapping one already taken is a conflict.
+    Returns (merged diff, [conflicting diffs]). Earlier diffs win.
+    """
+    header, taken, conflicts = "", [], []
+    for d in diffs:
+        h, hunks = split_hunks(d)
+        header = header or h
+        seen = {x for x, _ in taken}
+        hunks = [x for x in hunks if x not in seen]  # identical hunks aren't conflicts
+        ranges = [r for _, r in taken]
+        if any(hunk_range(x)[0] < e and s < hunk_range(x)[1] for x in hunks for s, e in ranges):
+            conflicts.append(d)
+            continue
+        taken.extend((x, hunk_range(x)) for x in hunks)
+    taken.sort(key=lambda t: t[1][0])
+    return header.rstrip("\n") + "\n" + "\n".join(x for x, _ in taken), conflicts
+
+def _parse_hunk(hunk: str) -> tuple[int, str, list[str]]:
+    """(old start, section heading, body lines); marker-less lines are context that lost its space."""
+    first, _, rest = hunk.partition("\n")
+    m = HUNK.match(first)
+    body = rest.split("\n") if rest else []
+    while body and not body[-1].strip():
+        body.pop()
+    body = [l if l[:1] in (" ", "+", "-", "\\") else " " + l for l in body]
+    return int(m.group(1)), first[m.end():], body
+
+def _anchor(lines: list[str], start: int, body: list[str]) -> tuple[int, list[str]]:
+    """Moves a hunk to the nearest spot where its old lines really are; (start, body) unchanged if nowhere."""
+    want = [l[1:] for l in body if l[:1] in (" ", "-")]
+    if not want:
+        return min(start, len(lines)), body
+    hint = max(start - 1, 0)
+    for strict in (True, False):  # exact first, then ignoring indentation/trailing blanks
+        key = (lambda x: x) if strict else str.strip
+        target = [key(w) for w in want]
+        hay = [key(x) for x in lines]
+        hits = [i for i in range(len(hay) - len(target) + 1)
+                if hay[i] == target[0] and hay[i:i + len(target)] == target]
+        if hits:
+            i = min(hits, key=lambda h: abs(h - hint))
+            if not strict:
+                real = iter(lines[i:i + len(want)])  # take the file's own whitespace
+                body = [l[0] + next(real) if l[:1] in (" ", "-") else l for l in body]
+            return _pad_context(lines, i, body)
+    return start, body
+
+def _pad_context(lines: list[str], i: int, body: list[str]) -> tuple[int, list[str]]:
+    """
+    git apply takes a hunk with less context on one side as anchored to that end of the file;
+    evens out leading/trailing context from the file so a truncated hunk still applies mid-file.
+    """
+    changed = [k for k, l in enumerate(body) if l[:1] in ("+", "-")]
+    if not changed:
+        return i + 1, body
+    lead, trail = changed[0], len(body) - 1 - changed[-1]
+    end = i + sum(1 for l in body if l[:1] in (" ", "-"))
+    if trail < lead:
+        body = body + [" " + x for x in lines[end:end + lead - trail]]
+    elif lead < trail:
+        k = min(trail - lead, i)
+        body = [" " + x for x in lines[i - k:i]] + body
+        i -= k
+    return i + 1, body
+
+def _locate(root: Path, hunks: list) -> str:
+    """Repo-relative path of the one file under src/ holding a headerless hunk's old lines (else "")."""
+    want = next(([l[1:].strip() for l in body if l[:1] in (" ", "-")] for _, _, body in hunks
+                 if any(l[:1] in (" ", "-") and l[1:].strip() for l in body)), None)
+    if not want:
+        return ""
+    found = []
+    for f in walk_files(root / "src"):
+        try:
+            hay = [x.strip() for x in f.read_text(encoding="utf-8").splitlines()]
+        except (OSError, UnicodeDecodeError):
+            continue
+        if any(hay[i:i + len(want)] == want for i in range(len(hay) - len(want) + 1) if hay[i] == want[0]):
+            found.append(f.relative_to(root).as_posix())
+            if len(found) > 1:
+                return ""
+    return found[0] if found else ""
+
+def repair_diff(diff: str, repo_root=None) -> str:
+    """
+    Fixes what local models typically get wrong in a single-file unified diff: @@ line counts are
+    recomputed from the hunk bodies (and new-side starts from the running offset), and context lines
+    that lost their leading space get it back. With repo_root, hunks are re-anchored to where their
+    context/removed lines really are in the file, and a diff without ---/+++ headers gets them when
+    its lines occur in exactly one file under src/. Whatever can't be fixed is left for git apply.
+    """
+    header, hunks = split_hunks(diff)
+    if not hunks:
+        return diff
+    old, new = _header_paths(header)
+    parsed = [_parse_hunk(h) for h in hunks]
+    root = Path(repo_root) if repo_root else None
+    if root and not old and not new:
+        old = new = _locate(root, parsed)
+
+    lines = None
+    if root and old and old != "/dev/null":
+        try:
+            lines = (root / old).read_text(encoding="utf-8").splitlines()
+        except (OSError, UnicodeDecodeError):
+            lines = None
+    if lines is not None:
+        anchored = []
+        for start, heading, body in parsed:
+            start, body = _anchor(lines, start, body)
+            anchored.append((start, heading, body))
+        parsed = anchored
+    parsed.sort(key=lambda h: h[0])
+
+    if old or new:
+        out = ["--- " + ("/dev/null" if old == "/dev/null" else f"a/{old or new}"),
+               "+++ " + ("/dev/null" if new == "/dev/null" else f"b/{new or old}")]
+    else:
+        out = [header.rstrip("\n")] if header.strip() else []
+    offset = 0
+    for start, heading, body in parsed:
+        n_old = sum(1 for l in body if l[:1] in (" ", "-"))
+        n_new = sum(1 for l in body if l[:1] in (" ", "+"))
+        if old == "/dev/null":
+            start = 0
+        new_start = start + offset + (1 if n_old == 0 else 0) - (1 if n_new == 0 else 0)
+        out.append(f"@@ -{start},{n_old} +{max(new_start, 0)},{n_new} @@{heading}")
+        out.extend(body)
+        offset += n_new - n_old
+    return "\n".join(out)
 
 def extract_full_java_files(text: str) -> dict[str,str]:
     """
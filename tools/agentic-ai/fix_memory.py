@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Fix memory: a small SQLite store mapping normalized failure signatures to the patches that
+validation showed fixing them. The agent looks every cluster up before calling a model; when
+each one has a stored fix that still applies (re-anchored onto the current files), those
+patches are proposed as-is.
+
+A signature is the endpoint shape (ids and path params folded to {}), the status mismatch and
+the exception's simple name, so the same failure class matches across branches and services;
+non-HTTP failures use the cluster's normalized stack instead of the endpoint.
+
+  python fix_memory.py            # list stored fixes, most reused first
+  python fix_memory.py --forget 7
+"""
+import argparse, hashlib, os, re, sqlite3, sys, tempfile, threading, time
+from pathlib import Path
+import yaml
+from diff_utils import merge_file_diffs, repair_diff
+from validate_patches import check_patch
+
+_PARAM   = re.compile(r"^(\{[^}]*\}|\([^)]*\)|\d+|[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{16,})$")
+_NUMBERS = re.compile(r"\d+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fixes (
+    id          INTEGER PRIMARY KEY,
+    signature   TEXT NOT NULL,
+    description TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    diff        TEXT NOT NULL,
+    diff_sha    TEXT NOT NULL,
+    successes   INTEGER NOT NULL DEFAULT 1,
+    failures    INTEGER NOT NULL DEFAULT 0,
+    created     REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    UNIQUE (signature, diff_sha)
+);
+CREATE INDEX IF NOT EXISTS fixes_signature ON fixes (signature);
+"""
+
+def normalize_path(path: str) -> str:
+    """/payments/42?x=1 and /payments/{id} both become /payments/{}."""
+    segs = (path or "").split("?", 1)[0].strip("/").split("/")
+    return "/" + "/".join("{}" if _PARAM.match(s) else s for s in segs if s)
+
+def describe(cluster) -> str:
+    exc = (cluster.exception or "").rsplit(".", 1)[-1]
+    if cluster.method:
+        return f"{cluster.method} {normalize_path(cluster.path)} {cluster.expected_status}->{cluster.actual_status} {exc}".strip()
+    return f"{exc} | {_NUMBERS.sub('#', cluster.stack_signature or '')}"
+
+def signature(cluster) -> str:
+    return hashlib.sha1(describe(cluster).encode("utf-8")).hexdigest()[:16]
+
+class FixMemory:
+    def __init__(self, db_path: Path, max_per_signature: int = 5):
+        self.path = Path(db_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_per_signature = int(max_per_signature)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def candidates(self, sig: str) -> list[sqlite3.Row]:
+        """Stored fixes for one signature, most successful (then most recent) first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM fixes WHERE signature = ? ORDER BY successes - failures DESC, last_used DESC LIMIT ?",
+                (sig, self.max_per_signature)).fetchall()
+
+    def record(self, cluster, path: str, diff: str):
+        """Remembers (or re-confirms) that this diff fixed this cluster's signature."""
+        now = time.time()
+        sha = hashlib.sha256(diff.encode("utf-8")).hexdigest()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO fixes (signature, description, path, diff, diff_sha, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (signature, diff_sha) DO UPDATE SET "
+                "successes = successes + 1, last_used = excluded.last_used",
+                (signature(cluster), describe(cluster), path, diff, sha, now, now))
+
+    def reject(self, ids):
+        """A recalled fix that validation showed no longer fixing anything."""
+        with self._lock, self._db:
+            self._db.executemany("UPDATE fixes SET failures = failures + 1 WHERE id = ?", [(i,) for i in ids])
+
+    def forget(self, fix_id: int) -> bool:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM fixes WHERE id = ?", (fix_id,)).rowcount > 0
+
+    def rows(self) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM fixes ORDER BY successes DESC, last_used DESC").fetchall()
+
+    def recall(self, clusters: list, repo_root: Path) -> dict:
+        """
+        {"patches": {path: diff}, "ids": [fix ids], "covered": {cluster key: description}} using,
+        per cluster, the best stored fix that still applies once re-anchored onto the current files;
+        None unless every cluster is covered.
+        """
+        patches, ids, covered = {}, [], {}
+        with tempfile.TemporaryDirectory(prefix="agentic-memory-") as tmp:
+            for c in clusters:
+                for row in self.candidates(signature(c)):
+                    diff = repair_diff(row["diff"], repo_root)
+                    if row["path"] in patches:
+                        merged, conflicts = merge_file_diffs([patches[row["path"]], diff])
+                        if conflicts:
+                            continue
+                        diff = repair_diff(merged, repo_root)
+                    p = Path(tmp) / f"fix_{row['id']}.diff"
+                    p.write_text(diff.rstrip("\n") + "\n", encoding="utf-8")
+                    if check_patch(repo_root, p)["applies"]:
+                        patches[row["path"]] = diff
+                        ids.append(row["id"])
+                        covered[c.key] = f"{row['description']} (fix #{row['id']}, validated {row['successes']}x)"
+                        break
+                else:
+                    return None
+        with self._lock, self._db:
+            self._db.executemany("UPDATE fixes SET last_used = ? WHERE id = ?", [(time.time(), i) for i in ids])
+        return {"patches": patches, "ids": ids, "covered": covered}
+
+    def close(self):
+        self._db.close()
+
+def from_config(cfg: dict, output_dir: Path) -> FixMemory:
+    """The db lives under output_dir unless fix_memory.file is absolute (e.g. shared across services)."""
+    mc = cfg.get("fix_memory", {}) or {}
+    path = Path(os.path.expanduser(str(mc.get("file", "fix_memory.sqlite"))))
+    return FixMemory(path if path.is_absolute() else output_dir / path, mc.get("max_per_signature", 5))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--forget", type=int, metavar="ID", help="Delete one stored fix")
+    args = ap.parse_args()
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+    root = Path(cfg.get("repo_root", "../../")).resolve()
+    memory = from_config(cfg, root / cfg.get("output_dir", ".agentic"))
+    if args.forget is not None:
+        ok = memory.forget(args.forget)
+        print(f"fix {args.forget} {'forgotten' if ok else 'not found'}")
+        return 0 if ok else 1
+    rows = memory.rows()
+    print(f"{len(rows)} stored fix(es) in {memory.path}")
+    for r in rows:
+        print(f"{r['id']:4d}  +{r['successes']}/-{r['failures']}  {r['path']}  [{r['description']}]")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
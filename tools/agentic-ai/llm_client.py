@@ -1,23 +1,439 @@
-import requests, json
+import requests, json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-class OllamaClient:
-    def __init__(self, ollama_cfg: dict):
-        self.base = ollama_cfg["base_url"].rstrip("/")
-        self.models = {
-            "planner_model": ollama_cfg["planner_model"],
-            "coder_model": ollama_cfg["coder_model"],
-            "critic_model": ollama_cfg.get("critic_model", ollama_cfg["planner_model"])
-        }
+# worth retrying: server overloaded / restarting, or a proxy in between hiccuped
+RETRY_STATUS = {500, 502, 503, 504}
+
+class LLMBackend:
+    """
+    Shared plumbing for one LLM server: pooled keep-alive session, retries with jittered backoff,
+    token usage, per-thread metadata of the latest call (for tracing) and the response cache.
+    Subclasses implement _generate() and _stream() and return Ollama-shaped results
+    ({"response", "done", "prompt_eval_count", "eval_count", ...}) so callers never care which server answered.
+    """
+    kind = "base"
+
+    def __init__(self, cfg: dict, cache=None, name: str = None):
+        self.name = name or self.kind
+        self.base = cfg["base_url"].rstrip("/")
+        self.cache = cache  # optional response_cache.ResponseCache
+
+        # one pooled keep-alive session for every stage instead of a TCP connect per call
+        pool = int(cfg.get("pool_size", 4))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timeout = (float(cfg.get("connect_timeout", 5)),
+                        float(cfg.get("read_timeout", 600)))
+        self.max_retries  = int(cfg.get("max_retries", 3))
+        self.backoff_base = float(cfg.get("backoff_base", 1.0))
+        self.backoff_max  = float(cfg.get("backoff_max", 30.0))
+        self.retries = 0
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+        self._local = threading.local()  # per-thread metadata of the latest call, for tracing
+
+        # context window per request; fast mode trades context for speed
+        self.num_ctx      = int(cfg.get("num_ctx", 2048))
+        self.fast_num_ctx = int(cfg.get("fast_num_ctx", self.num_ctx))
+        self.temperature  = float(cfg.get("temperature", 0.7))
+        # prompts complete_batch() keeps in flight at once; concurrent requests per model (None = agent default)
+        self.batch_size   = int(cfg.get("batch_size", 1))
+        self.concurrency  = int(cfg["concurrency"]) if cfg.get("concurrency") else None
+
+    def context_window(self, fast: bool = False) -> int:
+        return self.fast_num_ctx if fast else self.num_ctx
+
+    def _post(self, path: str, payload: dict, stream: bool = False, headers: dict = None) -> requests.Response:
+        """
+        POST on the pooled session. Connection errors, timeouts and 5xx are retried
+        with full-jitter exponential backoff; anything else raises at once.
+        """
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(f"{self.base}{path}", json=payload, headers=headers,
+                                      timeout=self.timeout, stream=stream)
+                if r.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    r.raise_for_status()
+                    return r
+                r.close()
+                reason = f"HTTP {r.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(e).__name__
+            attempt += 1
+            self.retries += 1
+            self._meta()["retries"] = attempt
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+            print(f"[WARN] {self.name} {reason}; retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _count_usage(self, data: dict):
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += int(data.get("prompt_eval_count") or 0)
+            self.usage["completion_tokens"] += int(data.get("eval_count") or 0)
+
+    def _meta(self, reset: bool = False) -> dict:
+        if reset or not hasattr(self._local, "meta"):
+            self._local.meta = {"retries": 0}
+        return self._local.meta
+
+    def _record_call(self, data: dict):
+        """Token counts and durations (ns, Ollama-style) from the final response/chunk."""
+        meta = self._meta()
+        for k in ("prompt_eval_count", "eval_count"):
+            if data.get(k) is not None:
+                meta[k] = int(data[k])
+        for k, out in (("eval_duration", "eval_seconds"), ("prompt_eval_duration", "prompt_eval_seconds"),
+                       ("load_duration", "load_seconds"), ("total_duration", "total_seconds")):
+            if data.get(k) is not None:
+                meta[out] = round(int(data[k]) / 1e9, 3)
+
+    def _start_call(self, model: str) -> dict:
+        meta = self._meta(reset=True)
+        meta["model"] = model
+        meta["backend"] = self.name
+        return meta
+
+    def last_call(self) -> dict:
+        """Metadata of this thread's latest call: token counts, durations, cache hit, retries."""
+        return dict(self._meta())
+
+    def tokens_used(self) -> int:
+        with self._usage_lock:
+            return self.usage["prompt_tokens"] + self.usage["completion_tokens"]
 
-    def complete(self, which: str, prompt: str) -> str:
-        model = self.models[which]
+    def _options(self, fast: bool) -> dict:
+        return {"temperature": self.temperature}
+
+    def _cached(self, model: str, prompt: str, fast: bool):
+        """(cache key or None, cached text or None); marks the call as a cache hit."""
+        if self.cache is None:
+            return None, None
+        key = self.cache.key(model, prompt, self._options(fast))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._meta()["cache_hit"] = 1
+        return key, cached
+
+    def complete(self, model: str, prompt: str, fast: bool = False) -> str:
+        self._start_call(model)
+        key, cached = self._cached(model, prompt, fast)
+        if cached is not None:
+            return cached
+        data = self._generate(model, prompt, fast)
+        self._count_usage(data)
+        self._record_call(data)
+        text = data.get("response", "")
+        if key:
+            self.cache.put(key, text, model)
+        return text
+
+    def generate_stream(self, model: str, prompt: str, fast: bool = False):
+        """
+        Yields chunks ({"response": "...", "done": false}, ...) as they arrive.
+        Closing the generator early (break / .close()) drops the connection, which makes
+        the server stop generating. Cache hits come back as a single done chunk; only
+        generations that ran to completion are cached.
+        """
+        self._start_call(model)
+        key, cached = self._cached(model, prompt, fast)
+        if cached is not None:
+            yield {"response": cached, "done": True, "cached": True}
+            return
+        buf = []
+        gen = self._stream(model, prompt, fast)
+        try:
+            for chunk in gen:
+                buf.append(chunk.get("response") or "")
+                if chunk.get("done"):
+                    # counted before the yield: the consumer may close us right after the last chunk
+                    self._count_usage(chunk)
+                    self._record_call(chunk)
+                    if key:
+                        self.cache.put(key, "".join(buf), model)
+                    yield chunk
+                    break
+                yield chunk
+        finally:
+            gen.close()
+
+    def complete_batch(self, model: str, prompts: list[str], fast: bool = False) -> list[str]:
+        """Completions for several prompts, in order; batch_size of them in flight at once."""
+        if self.batch_size <= 1 or len(prompts) < 2:
+            return [self.complete(model, p, fast) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.batch_size, len(prompts)),
+                                thread_name_prefix=f"{self.name}-batch") as pool:
+            return list(pool.map(lambda p: self.complete(model, p, fast), prompts))
+
+    def ping(self, model: str) -> bool:
+        return True
+
+    def _generate(self, model: str, prompt: str, fast: bool) -> dict:
+        raise NotImplementedError
+
+    def _stream(self, model: str, prompt: str, fast: bool):
+        raise NotImplementedError
+
+class OllamaBackend(LLMBackend):
+    """Ollama's /api/generate (NDJSON streaming)."""
+    kind = "ollama"
+
+    def __init__(self, cfg: dict, cache=None, name: str = None):
+        super().__init__(cfg, cache, name)
+        # keeps models resident between calls instead of Ollama's default 5 minutes
+        self.keep_alive = cfg.get("keep_alive") or None
+
+    def _options(self, fast: bool) -> dict:
+        return {"num_ctx": self.context_window(fast), "temperature": self.temperature}
+
+    def _payload(self, model: str, prompt: str, stream: bool, fast: bool = False) -> dict:
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
-            "options": {"num_ctx": 2048, "temperature": 0.7}
+            "stream": stream,
+            "options": self._options(fast)
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _generate(self, model: str, prompt: str, fast: bool) -> dict:
+        return self._post("/api/generate", self._payload(model, prompt, False, fast)).json()
+
+    def _stream(self, model: str, prompt: str, fast: bool):
+        r = self._post("/api/generate", self._payload(model, prompt, True, fast), stream=True)
+        try:
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama stream error: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    break
+        finally:
+            r.close()
+
+    def ping(self, model: str) -> bool:
+        """
+        Loads `model` (or just extends its keep_alive) without generating anything:
+        Ollama treats a generate request with no prompt as a load. No retries, errors are swallowed.
+        """
+        payload = {"model": model, "stream": False}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            r = self.session.post(f"{self.base}/api/generate", json=payload, timeout=self.timeout)
+            return r.ok
+        except requests.RequestException:
+            return False
+
+class OpenAICompatBackend(LLMBackend):
+    """
+    OpenAI-compatible /v1 server (vLLM, llama.cpp server, LM Studio, ...).
+    api: "chat" sends one user message per prompt (the server applies the chat template);
+    api: "completions" sends raw prompts and batches many prompts into one request.
+    """
+    kind = "openai"
+
+    def __init__(self, cfg: dict, cache=None, name: str = None):
+        super().__init__(cfg, cache, name)
+        self.api = cfg.get("api", "chat")
+        if self.api not in ("chat", "completions"):
+            raise ValueError(f"backends.{self.name}: api must be 'chat' or 'completions', not {self.api!r}")
+        self.max_tokens = int(cfg.get("max_tokens", 1024))
+        self.include_usage = bool(cfg.get("include_usage", True))
+        key = os.getenv(cfg["api_key_env"], "") if cfg.get("api_key_env") else cfg.get("api_key", "")
+        self.headers = {"Authorization": f"Bearer {key}"} if key else None
+
+    def _options(self, fast: bool) -> dict:
+        return {"api": self.api, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _payload(self, model: str, prompt, stream: bool) -> dict:
+        payload = {"model": model, "temperature": self.temperature, "max_tokens": self.max_tokens, "stream": stream}
+        if self.api == "chat":
+            payload["messages"] = [{"role": "user", "content": prompt}]
+        else:
+            payload["prompt"] = prompt
+        if stream and self.include_usage:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @property
+    def _path(self) -> str:
+        return "/chat/completions" if self.api == "chat" else "/completions"
+
+    @staticmethod
+    def _text(choice: dict) -> str:
+        if "message" in choice:
+            return (choice["message"] or {}).get("content") or ""
+        if "delta" in choice:
+            return (choice["delta"] or {}).get("content") or ""
+        return choice.get("text") or ""
+
+    @staticmethod
+    def _usage(data: dict) -> dict:
+        u = data.get("usage") or {}
+        return {"prompt_eval_count": u.get("prompt_tokens"), "eval_count": u.get("completion_tokens")}
+
+    def _generate(self, model: str, prompt: str, fast: bool) -> dict:
+        t0 = time.time()
+        data = self._post(self._path, self._payload(model, prompt, False), headers=self.headers).json()
+        text = self._text((data.get("choices") or [{}])[0])
+        return {"response": text, "done": True, "total_duration": int((time.time() - t0) * 1e9),
+                **self._usage(data)}
+
+    def _stream(self, model: str, prompt: str, fast: bool):
+        t0 = time.time()
+        r = self._post(self._path, self._payload(model, prompt, True), stream=True, headers=self.headers)
+        usage = {}
+        try:
+            for line in r.iter_lines():
+                if not line or not line.startswith(b"data:"):
+                    continue  # blank separators, ": keep-alive" comments
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise RuntimeError(f"{self.name} stream error: {chunk['error']}")
+                if chunk.get("usage"):
+                    usage = self._usage(chunk)
+                for choice in chunk.get("choices") or []:
+                    piece = self._text(choice)
+                    if piece:
+                        yield {"response": piece, "done": False}
+        finally:
+            r.close()
+        yield {"response": "", "done": True, "total_duration": int((time.time() - t0) * 1e9), **usage}
+
+    def complete_batch(self, model: str, prompts: list[str], fast: bool = False) -> list[str]:
+        """completions api: the cache misses go out as one request carrying a list of prompts."""
+        if self.api != "completions" or len(prompts) < 2:
+            return super().complete_batch(model, prompts, fast)
+        out, missing = [None] * len(prompts), []
+        for i, p in enumerate(prompts):
+            key, out[i] = self._cached(model, p, fast)
+            if out[i] is None:
+                missing.append((i, key))
+        meta = self._start_call(model)
+        meta.update(batch=len(prompts), cache_hit=len(prompts) - len(missing))
+        if missing:
+            t0 = time.time()
+            payload = self._payload(model, [prompts[i] for i, _ in missing], False)
+            data = self._post(self._path, payload, headers=self.headers).json()
+            texts = {c.get("index", n): self._text(c) for n, c in enumerate(data.get("choices") or [])}
+            stats = {"total_duration": int((time.time() - t0) * 1e9), **self._usage(data)}
+            self._count_usage(stats)
+            self._record_call(stats)
+            for n, (i, key) in enumerate(missing):
+                out[i] = texts.get(n, "")
+                if key:
+                    self.cache.put(key, out[i], model)
+        return out
+
+    def ping(self, model: str) -> bool:
+        try:
+            return self.session.get(f"{self.base}/models", headers=self.headers, timeout=self.timeout).ok
+        except requests.RequestException:
+            return False
+
+BACKEND_TYPES = {"ollama": OllamaBackend, "openai": OpenAICompatBackend}
+
+class LLMClient:
+    """
+    Routes each model role (planner_model, coder_model, critic_model, ...) to a backend.
+    The ollama: block is always the "ollama" backend; backends: adds more, and roles: picks
+    the backend (and optionally another model name) per role. Roles not listed stay on Ollama.
+    """
+
+    def __init__(self, cfg: dict, cache=None):
+        ollama_cfg = cfg["ollama"]
+        self.cache = cache
+        self.backends = {"ollama": OllamaBackend(ollama_cfg, cache, name="ollama")}
+        for name, bcfg in (cfg.get("backends") or {}).items():
+            kind = (bcfg or {}).get("type", "openai")
+            if kind not in BACKEND_TYPES:
+                raise ValueError(f"backends.{name}: unknown type {kind!r} (one of {', '.join(BACKEND_TYPES)})")
+            self.backends[name] = BACKEND_TYPES[kind](bcfg, cache, name=name)
+
+        defaults = {
+            "planner_model": ollama_cfg["planner_model"],
+            "coder_model": ollama_cfg["coder_model"],
+            "critic_model": ollama_cfg.get("critic_model", ollama_cfg["planner_model"])
         }
-        r = requests.post(f"{self.base}/api/generate", json=payload, timeout=600)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("response", "")
+        roles = cfg.get("roles") or {}
+        self.models, self.routes = {}, {}
+        for role in [*defaults, *(r for r in roles if r not in defaults)]:
+            r = roles.get(role) or {}
+            if isinstance(r, str):
+                r = {"backend": r}
+            backend = r.get("backend", "ollama")
+            if backend not in self.backends:
+                raise ValueError(f"roles.{role}: unknown backend {backend!r}")
+            model = r.get("model") or defaults.get(role)
+            if not model:
+                raise ValueError(f"roles.{role}: needs a model")
+            self.models[role] = model
+            self.routes[role] = self.backends[backend]
+        self._local = threading.local()
+
+    def _use(self, which: str) -> LLMBackend:
+        b = self.routes[which]
+        self._local.backend = b
+        return b
+
+    def context_window(self, fast: bool = False, which: str = None) -> int:
+        """Window of one role's backend, or the smallest across roles (packed prompts are shared between stages)."""
+        if which:
+            return self.routes[which].context_window(fast)
+        return min(b.context_window(fast) for b in set(self.routes.values()))
+
+    def complete(self, which: str, prompt: str, fast: bool = False, verbose: bool = False) -> str:
+        return self._use(which).complete(self.models[which], prompt, fast)
+
+    def generate_stream(self, which: str, prompt: str, fast: bool = False, verbose: bool = False):
+        return self._use(which).generate_stream(self.models[which], prompt, fast)
+
+    def complete_batch(self, which: str, prompts: list[str], fast: bool = False) -> list[str]:
+        return self._use(which).complete_batch(self.models[which], prompts, fast)
+
+    def supports_batch(self, which: str) -> bool:
+        return self.routes[which].batch_size > 1
+
+    def slot_key(self, which: str) -> tuple:
+        return self.routes[which].name, self.models[which]
+
+    def slot_limit(self, which: str):
+        return self.routes[which].concurrency
+
+    def ping(self, which: str) -> bool:
+        return self.routes[which].ping(self.models[which])
+
+    def last_call(self) -> dict:
+        b = getattr(self._local, "backend", None)
+        return b.last_call() if b else {}
+
+    @property
+    def retries(self) -> int:
+        return sum(b.retries for b in self.backends.values())
+
+    def tokens_used(self) -> int:
+        return sum(b.tokens_used() for b in self.backends.values())
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False, "hits": 0, "misses": 0}
+        return {"enabled": True, **self.cache.stats()}
+
+class OllamaClient(LLMClient):
+    """Pre-routing interface kept for agent2.py: built from the ollama: block alone, every role on Ollama."""
+
+    def __init__(self, ollama_cfg: dict, cache=None):
+        super().__init__({"ollama": ollama_cfg}, cache)
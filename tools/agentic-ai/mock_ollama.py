@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Ollama's /api/generate, for benchmarks and offline runs.
+Latency = fixed time-to-first-token + response tokens / tokens_per_sec, streamed or not,
+with Ollama-style eval_count / eval_duration / prompt_eval_count in the final chunk.
+Also answers the OpenAI-compatible /v1/chat/completions and /v1/completions (SSE streaming,
+list prompts batched into one response) for the openai backend type.
+"""
+import argparse, json, sys, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_RESPONSE = """Summary: POST /payments returns 400 where the contract expects 201.
+
+```diff
+--- a/src/main/java/com/example/payments_api/controller/PaymentController.java
++++ b/src/main/java/com/example/payments_api/controller/PaymentController.java
+@@ -24,7 +24,7 @@ public class PaymentController {
+             @Valid @RequestBody PaymentRequest request) {
+
+-        if (request.amount() == null || request.amount() < 0.01) {
++        if (request.amount() == null || request.amount() <= 0) {
+             return ResponseEntity.badRequest()
+                     .body(new ErrorResponse("BAD_REQUEST", "Invalid amount"));
+         }
+```
+"""
+
+class MockOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2,
+                 tokens_per_sec: float = 200.0, response: str = DEFAULT_RESPONSE, chars_per_token: int = 4):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.response = response
+        self.chars_per_token = chars_per_token
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllama":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._json({"object": "list", "data": []})  # /v1/models, for pings
+
+            def _json(self, obj):
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with mock._lock:
+                    mock.requests += 1
+                if self.path.startswith("/v1/"):
+                    return self._openai(body)
+                text = mock.response
+                step = mock.chars_per_token
+                pieces = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+                per_token = 1.0 / mock.tokens_per_sec if mock.tokens_per_sec > 0 else 0.0
+                prompt_tokens = len(body.get("prompt", "")) // step
+                t0 = time.time()
+                time.sleep(mock.latency)
+
+                def final(extra):
+                    dur = time.time() - t0
+                    return {"model": body.get("model"), "done": True, "prompt_eval_count": prompt_tokens,
+                            "eval_count": len(pieces), "eval_duration": int(dur * 1e9),
+                            "total_duration": int(dur * 1e9), **extra}
+
+                if not body.get("stream", True):
+                    time.sleep(per_token * len(pieces))
+                    data = json.dumps(final({"response": text})).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for p in pieces:
+                        time.sleep(per_token)
+                        self._chunk({"model": body.get("model"), "response": p, "done": False})
+                    self._chunk(final({"response": ""}))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client cancelled the generation
+
+            def _openai(self, body):
+                chat = self.path.endswith("/chat/completions")
+                prompts = [m.get("content", "") for m in body.get("messages", [])][-1:] if chat \
+                    else body.get("prompt", "")
+                prompts = prompts if isinstance(prompts, list) else [prompts]
+                step = mock.chars_per_token
+                pieces = [mock.response[i:i + step] for i in range(0, len(mock.response), step)] or [""]
+                per_token = 1.0 / mock.tokens_per_sec if mock.tokens_per_sec > 0 else 0.0
+                usage = {"prompt_tokens": sum(len(p) for p in prompts) // step,
+                         "completion_tokens": len(pieces) * len(prompts)}
+                time.sleep(mock.latency)
+
+                def choice(i, text, delta=False):
+                    if chat:
+                        return {"index": i, ("delta" if delta else "message"): {"role": "assistant", "content": text}}
+                    return {"index": i, "text": text}
+
+                if not body.get("stream"):
+                    time.sleep(per_token * len(pieces))  # batched prompts decode side by side
+                    return self._json({"choices": [choice(i, mock.response) for i in range(len(prompts))],
+                                       "usage": usage})
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for p in pieces:
+                        time.sleep(per_token)
+                        self._chunk({"choices": [choice(0, p, delta=True)]}, sse=True)
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        self._chunk({"choices": [], "usage": usage}, sse=True)
+                    self._raw(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _raw(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _chunk(self, obj, sse: bool = False):
+                if sse:
+                    return self._raw(f"data: {json.dumps(obj)}\n\n".encode("utf-8"))
+                self._raw((json.dumps(obj) + "\n").encode("utf-8"))
+
+        return Handler
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=200.0)
+    ap.add_argument("--response-file", help="Serve this text instead of the built-in diff reply")
+    args = ap.parse_args()
+
+    response = open(args.response_file, encoding="utf-8").read() if args.response_file else DEFAULT_RESPONSE
+    mock = MockOllama(port=args.port, latency=args.latency, tokens_per_sec=args.tokens_per_sec, response=response)
+    print(f"Mock Ollama on {mock.base_url} (latency={args.latency}s, {args.tokens_per_sec} tok/s)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,255 @@
+import re, textwrap
+from dataclasses import dataclass, field, asdict
 from lxml import etree
 from pathlib import Path
 
-def parse_surefire_and_specmatic(surefire_dir: Path, specmatic_log: Path) -> str:
-    sb = []
-    sb.append("== Parsed Test Results ==")
+SCENARIO = re.compile(r'Testing scenario "([^"]*)"')
+API      = re.compile(r"API:\s*([A-Z]+)\s+(\S+)\s*->\s*(\d{3})")
+STATUS   = re.compile(r"Expected status (\d{3}), actual was status (\d{3})")
+# console line opening each scenario's result block
+LIVE     = re.compile(r"^\s*Scenario:\s*([A-Z]+)\s+(\S+)\s*->\s*(\d{3})\s+has\s+(FAILED|SUCCEEDED)")
+# console lines around the HTTP request Specmatic sent before each scenario's result
+REQUEST  = re.compile(r"^\s*Request to \S+")
+RESPONSE = re.compile(r"^\s*Response at ")
+# specmatic.log lines worth keeping beyond the head of the file
+LOG_INTERESTING = re.compile(r"ERROR|WARN|Exception|Expected|API:|FAIL|Caused by", re.IGNORECASE)
+
+DETAILS_MAX = 2000
+STACK_FRAMES = 4
+
+@dataclass
+class SuiteResult:
+    name: str
+    tests: str = "?"
+    failures: str = "?"
+    errors: str = "?"
+    skipped: str = "0"
+    file: str = ""
+
+@dataclass
+class FailureRecord:
+    suite: str
+    testcase: str
+    kind: str                      # "failure" | "error"
+    message: str = ""
+    scenario: str = ""
+    method: str = ""
+    path: str = ""
+    expected_status: int = None
+    actual_status: int = None
+    exception: str = ""
+    stack_summary: list[str] = field(default_factory=list)
+    details: str = ""              # failure text, capped at DETAILS_MAX
+    request: str = ""              # the HTTP request Specmatic sent (console output only)
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.method} {self.path}".strip()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+@dataclass
+class ParsedReports:
+    surefire_dir: str
+    found: bool = True
+    suites: list[SuiteResult] = field(default_factory=list)
+    failures: list[FailureRecord] = field(default_factory=list)
+    parser_errors: list[str] = field(default_factory=list)
+    log_excerpt: list[str] = field(default_factory=list)
+    log_lines: int = 0
+    log_found: bool = False
+
+    def endpoints(self) -> list[tuple[str, str]]:
+        """Distinct (METHOD, path) of failing scenarios, in first-seen order."""
+        seen = []
+        for f in self.failures:
+            if f.method and (f.method, f.path) not in seen:
+                seen.append((f.method, f.path))
+        return seen
+
+def _failure_record(suite: str, tc_name: str, node) -> FailureRecord:
+    msg = (node.attrib.get("message") or "").strip()
+    text = (node.text or "").strip()
+    rec = FailureRecord(suite=suite, testcase=tc_name, kind=etree.QName(node).localname,
+                        message=msg, exception=node.attrib.get("type", ""), details=text[:DETAILS_MAX])
+    both = msg + "\n" + text
+    m = SCENARIO.search(both)
+    if m:
+        rec.scenario = m.group(1)
+    api = API.search(both)
+    if api:
+        rec.method, rec.path = api.group(1), api.group(2)
+        rec.expected_status = int(api.group(3))
+    m = STATUS.search(both)
+    if m:
+        rec.expected_status, rec.actual_status = int(m.group(1)), int(m.group(2))
+    rec.stack_summary = [l.strip() for l in text.splitlines() if l.strip().startswith("at ")][:STACK_FRAMES]
+    return rec
+
+class LiveParser:
+    """
+    Incremental failure parser for the test run's console output, fed one line at a time while
+    the suite is still running. Specmatic prints "Scenario: POST /payments -> 201 has FAILED"
+    followed by a "Reason:" block; each block becomes a FailureRecord as soon as the next
+    scenario, separator or Maven log line ends it, carrying the "Request to ..." block printed
+    before it. Only the records are kept, not the output.
+    """
+
+    def __init__(self, max_lines: int = 60):
+        self.max_lines = max_lines
+        self.failures: list[FailureRecord] = []
+        self.passed = 0
+        self._block = None  # (scenario match, reason lines, request)
+        self._request, self._in_request = [], False
+
+    def feed(self, line: str) -> FailureRecord:
+        """The failure this line completed, if any."""
+        line = line.rstrip("\n")
+        m = LIVE.match(line)
+        done = None
+        if self._block is not None:
+            if not m and not line.startswith(("--------", "[")):
+                if len(self._block[1]) < self.max_lines:
+                    self._block[1].append(line)
+                return None
+            done = self._finish()
+        if m and m.group(4) == "FAILED":
+            self._block = (m, [], textwrap.dedent("\n".join(self._request)).strip())
+        elif m:
+            self.passed += 1
+        if m:
+            self._request, self._in_request = [], False
+        elif REQUEST.match(line):
+            self._request, self._in_request = [], True
+        elif RESPONSE.match(line):
+            self._in_request = False
+        elif self._in_request and len(self._request) < self.max_lines:
+            self._request.append(line)
+        return done
+
+    def close(self) -> FailureRecord:
+        return self._finish() if self._block is not None else None
+
+    def _finish(self) -> FailureRecord:
+        m, lines, request = self._block
+        self._block = None
+        text = "\n".join(l.rstrip() for l in lines).strip()
+        rec = FailureRecord(suite="console", testcase=f"Scenario: {m.group(1)} {m.group(2)} -> {m.group(3)}",
+                            kind="failure", message=text.splitlines()[0] if text else "", method=m.group(1),
+                            path=m.group(2), expected_status=int(m.group(3)), details=text[:DETAILS_MAX],
+                            request=request[:DETAILS_MAX])
+        sc = SCENARIO.search(text)
+        if sc:
+            rec.scenario = sc.group(1)
+        st = STATUS.search(text)
+        if st:
+            rec.actual_status = int(st.group(2))
+        self.failures.append(rec)
+        return rec
+
+    def reports(self, surefire_dir: Path, note: str = "console") -> "ParsedReports":
+        """ParsedReports built from the console alone (e.g. a run stopped before surefire wrote XML)."""
+        return ParsedReports(surefire_dir=str(surefire_dir),
+                             suites=[SuiteResult(name=note, tests=str(self.passed + len(self.failures)),
+                                                 failures=str(len(self.failures)), errors="0")],
+                             failures=list(self.failures))
+
+def console_failures(lines) -> list[FailureRecord]:
+    """Failures from a finished run's console output (e.g. test_stdout.txt), via LiveParser."""
+    live = LiveParser()
+    for line in lines:
+        live.feed(line)
+    live.close()
+    return live.failures
+
+def iter_surefire(xml: Path):
+    """
+    Streams one surefire XML with iterparse, yielding a SuiteResult when the testsuite
+    opens and a FailureRecord per failed/errored testcase. Elements are cleared as soon
+    as they're consumed, so memory stays flat regardless of report size.
+    """
+    suite = xml.name
+    for event, el in etree.iterparse(str(xml), events=("start", "end"), huge_tree=True):
+        tag = etree.QName(el).localname
+        if event == "start":
+            if tag == "testsuite":
+                suite = el.attrib.get("name", xml.name)
+                yield SuiteResult(name=suite,
+                                  tests=el.attrib.get("tests", "?"),
+                                  failures=el.attrib.get("failures", "?"),
+                                  errors=el.attrib.get("errors", "?"),
+                                  skipped=el.attrib.get("skipped", "0"),
+                                  file=xml.name)
+            continue
+        if tag != "testcase":
+            continue
+        tc_name = el.attrib.get("name", "?")
+        for child in el:
+            if isinstance(child.tag, str) and etree.QName(child).localname in ("failure", "error"):
+                yield _failure_record(suite, tc_name, child)
+                break
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+
+def scan_log(log: Path, head: int = 40, max_lines: int = 200) -> tuple[list[str], int]:
+    """Line-by-line scan: keeps the first `head` lines plus interesting ones, up to max_lines."""
+    kept, total = [], 0
+    with open(log, "r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            total += 1
+            if len(kept) < max_lines and (total <= head or LOG_INTERESTING.search(line)):
+                kept.append(line.rstrip("\n"))
+    return kept, total
+
+def parse_reports(surefire_dir: Path, specmatic_log: Path) -> ParsedReports:
+    res = ParsedReports(surefire_dir=str(surefire_dir))
     if not surefire_dir.exists():
-        return f"No surefire dir: {surefire_dir}"
+        res.found = False
+        return res
 
     for xml in sorted(surefire_dir.glob("*.xml")):
         try:
-            root = etree.parse(str(xml)).getroot()
-            if root.tag != "testsuite":
-                continue
-            name = root.attrib.get("name", xml.name)
-            tests = root.attrib.get("tests", "?")
-            failures = root.attrib.get("failures", "?")
-            errors = root.attrib.get("errors", "?")
-            sb.append(f"Suite: {name} | tests={tests} failures={failures} errors={errors}")
-            for tc in root.findall("testcase"):
-                tc_name = tc.attrib.get("name", "?")
-                fails = tc.findall("failure")
-                if fails:
-                    msg = fails[0].attrib.get("message", "").strip()
-                    text = (fails[0].text or "").strip()
-                    sb.append(f"  FAIL: {tc_name} : {msg}")
-                    if text:
-                        sb.append(f"    DETAILS: {text[:2000]}")
+            for item in iter_surefire(xml):
+                if isinstance(item, SuiteResult):
+                    res.suites.append(item)
+                else:
+                    res.failures.append(item)
         except Exception as e:
-            sb.append(f"PARSER_ERROR: {xml.name}: {e}")
+            res.parser_errors.append(f"{xml.name}: {e}")
 
     if specmatic_log.exists():
-        txt = specmatic_log.read_text(encoding="utf-8", errors="ignore")
-        sb.append("\n== specmatic.log ==")
-        sb.append(txt[:4000] + ("\n...truncated..." if len(txt) > 4000 else ""))
+        res.log_found = True
+        res.log_excerpt, res.log_lines = scan_log(specmatic_log)
+    return res
+
+def render_text(res: ParsedReports, log_chars: int = 4000) -> str:
+    """Text form used in prompts and parsed.txt, derived from the records."""
+    if not res.found:
+        return f"No surefire dir: {res.surefire_dir}"
+    sb = ["== Parsed Test Results =="]
+    by_suite = {}
+    for f in res.failures:
+        by_suite.setdefault(f.suite, []).append(f)
+    for s in res.suites:
+        sb.append(f"Suite: {s.name} | tests={s.tests} failures={s.failures} errors={s.errors}")
+        for f in by_suite.get(s.name, []):
+            sb.append(f"  FAIL: {f.testcase} : {f.message}")
+            if f.details:
+                sb.append(f"    DETAILS: {f.details}")
+    for e in res.parser_errors:
+        sb.append(f"PARSER_ERROR: {e}")
+    sb.extend(render_log(res, log_chars))
     return "\n".join(sb)
+
+def render_log(res: ParsedReports, log_chars: int = 4000) -> list[str]:
+    if not res.log_found:
+        return []
+    txt = "\n".join(res.log_excerpt)
+    truncated = len(txt) > log_chars or res.log_lines > len(res.log_excerpt)
+    return ["\n== specmatic.log ==",
+            txt[:log_chars] + (f"\n...truncated ({res.log_lines} lines total)..." if truncated else "")]
+
+def parse_surefire_and_specmatic(surefire_dir: Path, specmatic_log: Path) -> str:
+    return render_text(parse_reports(surefire_dir, specmatic_log))
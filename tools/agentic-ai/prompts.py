@@ -11,6 +11,18 @@ REQUIREMENTS (very important):
 - Keep changes minimal and compilable.
 """
 
+from context_packer import (CHARS_PER_TOKEN, estimate_tokens, failing_endpoints, rank_files,
+                            fit_text, pack_files)
+
+# context sections each prompt actually uses (failures go into every prompt)
+STAGE_SECTIONS = {
+    "summary":   (),
+    "api":       ("code_ctx", "file_index"),
+    "spec":      ("spec_ctx", "file_index"),
+    "specmatic": ("cfg_ctx", "file_index"),
+    "diffs":     ("code_ctx", "spec_ctx", "cfg_ctx", "file_index"),
+}
+
 def build_prompts(parsed: str, code_ctx: str, spec_ctx: str, cfg_ctx: str, file_index: str = ""):
     return {
         "summary": f"""
@@ -91,3 +103,48 @@ FAILURES:
 {parsed}
 """
     }
+
+
+def build_packed_prompts(parsed: str, code_files: list, spec_files: list, cfg_ctx: str, file_index: str,
+                         budget_tokens: int, endpoints: list = None, max_files: int = 60,
+                         chars_per_token: float = CHARS_PER_TOKEN, stages: tuple = None,
+                         ranked: bool = False) -> dict:
+    """
+    Same prompts as build_prompts(), but each one is fitted to budget_tokens instead of
+    being cut at a character limit. The FAILURES section is always kept (only shortened,
+    head and tail, if it alone overflows); files are ranked by relevance to the failing
+    endpoints and packed whole, most relevant first, into whatever budget is left.
+    Pass stages=("diffs",) etc. to build only some of the prompts, and ranked=True when
+    code_files/spec_files are already in relevance order (retrieved chunks).
+    """
+    est = lambda t: estimate_tokens(t, chars_per_token)
+    endpoints = failing_endpoints(parsed) if endpoints is None else endpoints
+    if ranked:
+        ranked = {"code_ctx": list(code_files), "spec_ctx": list(spec_files)}
+    else:
+        ranked = {"code_ctx": rank_files(code_files, endpoints), "spec_ctx": rank_files(spec_files, endpoints)}
+
+    out = {}
+    for stage, sections in STAGE_SECTIONS.items():
+        if stages and stage not in stages:
+            continue
+        failures = parsed
+        room = budget_tokens - est(build_prompts(failures, "", "", "")[stage])
+        if room < 0:
+            failures = fit_text(parsed, max(64, est(parsed) + room), chars_per_token)
+            room = 0
+
+        ctx = {"code_ctx": "", "spec_ctx": "", "cfg_ctx": "", "file_index": ""}
+        # small sections first, each capped so they can't starve the source files
+        for key, text in (("file_index", file_index), ("cfg_ctx", cfg_ctx)):
+            if key in sections and room > 0 and text:
+                ctx[key] = fit_text(text, room // 4 if len(sections) > 2 else room // 2, chars_per_token)
+                room -= est(ctx[key])
+        big = [k for k in ("code_ctx", "spec_ctx") if k in sections]
+        for i, key in enumerate(big):
+            share = room if i == len(big) - 1 else room * 3 // 5
+            ctx[key] = pack_files(ranked[key], max(0, share), max_files, chars_per_token)
+            room -= est(ctx[key])
+
+        out[stage] = build_prompts(failures, ctx["code_ctx"], ctx["spec_ctx"], ctx["cfg_ctx"], ctx["file_index"])[stage]
+    return out
@@ -1,31 +1,148 @@
+import hashlib, json, os, re
 from pathlib import Path
 
+# System.setProperty("contractPaths", "a.yaml,b.yaml") in a Specmatic JUnit test class
+CONTRACT_PATHS = re.compile(r'setProperty\(\s*"contractPaths"\s*,\s*"([^"]+)"\s*\)')
+
+# Java members, for chunk_java (shared by retrieval.py's index and analyzer.py's handler scan)
+JAVA_SIG = re.compile(r"^\s*(?:@\w+(?:\([^)]*\))?\s+)*(?:(?:public|protected|private|static|final|abstract|"
+                      r"synchronized|default|native)\s+)*(?:<[^>]+>\s+)?[\w<>\[\],.?]+(?:\s*<[^>]*>)?\s+(\w+)\s*\(")
+JAVA_TYPE = re.compile(r"\b(class|interface|enum|record)\s+(\w+)")
+JAVA_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$')
+NOT_METHODS = {"if", "for", "while", "switch", "catch", "synchronized", "return", "new", "throw"}
+CHUNK_LINES = 60  # lines per chunk for files without a structure we understand
+
+# never walked: build output, VCS internals, deps, agent output
+IGNORE_DIRS = {".git", "target", "node_modules", ".agentic", ".venv", "venv", "__pycache__", ".idea"}
+
+def walk_files(base: Path):
+    """os.walk over base with IGNORE_DIRS pruned, in sorted order."""
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORE_DIRS)
+        for n in sorted(filenames):
+            yield Path(dirpath) / n
+
+class FileIndex:
+    """
+    Persistent index of repo files: relative path -> mtime, size, sha256.
+    refresh() does a single pruned walk and only re-hashes files whose mtime/size moved;
+    contents read through read() are kept in memory until the file changes, so every
+    context builder in a process (and every run of a long-lived agent) shares one read.
+    """
+
+    def __init__(self, root: Path, index_path: Path = None):
+        self.root = Path(root)
+        self.index_path = index_path
+        self.entries = {}   # rel -> {"mtime", "size", "sha"}
+        self._content = {}  # rel -> str, only for entries unchanged since they were read
+        if index_path and Path(index_path).exists():
+            try:
+                data = json.loads(Path(index_path).read_text(encoding="utf-8"))
+                if data.get("root") == str(self.root):
+                    self.entries = data.get("files", {})
+            except ValueError:
+                pass
+        self._walked = False
+
+    def refresh(self) -> set[str]:
+        """Re-stat the tree; returns rel paths that were added, modified or removed."""
+        changed, seen = set(), set()
+        for f in walk_files(self.root):
+            rel = f.relative_to(self.root).as_posix()
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            seen.add(rel)
+            old = self.entries.get(rel)
+            if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                continue
+            self.entries[rel] = {"mtime": st.st_mtime, "size": st.st_size, "sha": None}
+            self._content.pop(rel, None)
+            changed.add(rel)
+        for rel in set(self.entries) - seen:
+            del self.entries[rel]
+            self._content.pop(rel, None)
+            changed.add(rel)
+        self._walked = True
+        return changed
+
+    def _ensure(self):
+        if not self._walked:
+            self.refresh()
+
+    def files(self, under: str = "") -> list[str]:
+        """Sorted rel paths under a rel dir (or the single file itself)."""
+        self._ensure()
+        under = under.strip("/").replace("\\", "/")
+        if under in ("", "."):
+            return sorted(self.entries)
+        if under in self.entries:
+            return [under]
+        prefix = under + "/"
+        return sorted(r for r in self.entries if r.startswith(prefix))
+
+    def read(self, rel: str) -> str:
+        self._ensure()
+        if rel in self._content:
+            return self._content[rel]
+        s = (self.root / rel).read_text(encoding="utf-8", errors="ignore")
+        if rel in self.entries:
+            self._content[rel] = s
+            if self.entries[rel]["sha"] is None:
+                self.entries[rel]["sha"] = hashlib.sha256(s.encode("utf-8")).hexdigest()
+        return s
+
+    def sha(self, rel: str) -> str:
+        self._ensure()
+        e = self.entries.get(rel)
+        if e is None:
+            return ""
+        if e["sha"] is None:
+            try:
+                e["sha"] = hashlib.sha256((self.root / rel).read_bytes()).hexdigest()
+            except OSError:
+                return ""
+        return e["sha"]
+
+    def save(self):
+        if not self.index_path:
+            return
+        tmp = Path(str(self.index_path) + ".tmp")
+        tmp.write_text(json.dumps({"root": str(self.root), "files": self.entries}), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
 def ensure_outdir(p: Path) -> Path:
     p.mkdir(parents=True, exist_ok=True)
     (p / "patches").mkdir(parents=True, exist_ok=True)
     return p
 
-def _read_file(p: Path, max_chars: int) -> str:
+def _read_file(p: Path, max_chars: int, index: FileIndex = None) -> str:
     try:
-        s = p.read_text(encoding="utf-8", errors="ignore")
+        if index is not None:
+            s = index.read(p.relative_to(index.root).as_posix())
+        else:
+            s = p.read_text(encoding="utf-8", errors="ignore")
         return s[:max_chars]
     except Exception as e:
         return f"READ_ERROR({p}): {e}"
 
-def snapshot_code(root: Path, rels: list[str], limits: dict) -> str:
+def snapshot_code(root: Path, rels: list[str], limits: dict, index: FileIndex = None) -> str:
     max_files = limits.get("files_per_section", 60)
     max_chars = limits.get("max_context_chars", 120000)
+    index = index or FileIndex(root)
     chunks, count, used = [], 0, 0
     for r in rels:
         p = (root / r)
         if p.is_file():
-            content = _read_file(p, max_chars - used)
+            content = _read_file(p, max_chars - used, index)
             chunks.append(f"\n--- FILE: {p} ---\n{content}\n")
             used += len(content)
         elif p.is_dir():
-            for f in p.rglob("*"):
+            for rel in index.files(r):
+                f = root / rel
                 if f.suffix.lower() in {".java", ".yml", ".yaml", ".json"} or f.name == "pom.xml":
-                    content = _read_file(f, max_chars - used)
+                    content = _read_file(f, max_chars - used, index)
                     chunks.append(f"\n--- FILE: {f} ---\n{content}\n")
                     used += len(content)
                     count += 1
@@ -35,13 +152,15 @@ def snapshot_code(root: Path, rels: list[str], limits: dict) -> str:
             break
     return "".join(chunks)
 
-def read_specs(root: Path, keyword: str, limits: dict) -> str:
+def read_specs(root: Path, keyword: str, limits: dict, index: FileIndex = None) -> str:
     max_files = limits.get("files_per_section", 60)
     max_chars = limits.get("max_context_chars", 120000)
+    index = index or FileIndex(root)
     chunks, count, used = [], 0, 0
-    for f in root.rglob("*"):
-        if f.is_file() and f.suffix.lower() in {".yaml",".yml",".json"} and keyword.lower() in str(f).lower():
-            content = _read_file(f, max_chars - used)
+    for rel in index.files():
+        f = root / rel
+        if f.suffix.lower() in {".yaml",".yml",".json"} and keyword.lower() in str(f).lower():
+            content = _read_file(f, max_chars - used, index)
             chunks.append(f"\n--- FILE: {f} ---\n{content}\n")
             used += len(content)
             count += 1
@@ -49,6 +168,25 @@ def read_specs(root: Path, keyword: str, limits: dict) -> str:
                 break
     return "".join(chunks)
 
+def collect_files(root: Path, rels: list[str], index: FileIndex = None) -> list[tuple[str, str]]:
+    """(rel path, full content) of the source/config files under rels, in walk order."""
+    index = index or FileIndex(root)
+    out, seen = [], set()
+    for r in rels:
+        for rel in index.files(r):
+            f = Path(rel)
+            if rel in seen or not (f.suffix.lower() in {".java", ".yml", ".yaml", ".json"} or f.name == "pom.xml"):
+                continue
+            seen.add(rel)
+            out.append((rel, _read_file(root / rel, 10**9, index)))
+    return out
+
+def collect_specs(root: Path, keyword: str, index: FileIndex = None) -> list[tuple[str, str]]:
+    """(rel path, full content) of spec files whose path contains keyword."""
+    index = index or FileIndex(root)
+    return [(rel, _read_file(root / rel, 10**9, index)) for rel in index.files()
+            if Path(rel).suffix.lower() in {".yaml", ".yml", ".json"} and keyword.lower() in rel.lower()]
+
 def read_if_exists(root: Path, rel: str) -> str:
     p = root / rel
     return f"\n--- FILE: {p} ---\n{_read_file(p, 50000)}\n" if p.exists() else ""
@@ -56,7 +194,7 @@ def read_if_exists(root: Path, rel: str) -> str:
 
 # tools/agentic-ai/repo_utils.py (append at end)
 
-def build_file_index(root: Path, max_paths: int = 300) -> str:
+def build_file_index(root: Path, max_paths: int = 300, index: FileIndex = None) -> str:
     """
     Returns a plain list of relevant file paths (relative to repo root).
     Prioritize Java, OpenAPI, config, and test sources.
@@ -67,17 +205,95 @@ def build_file_index(root: Path, max_paths: int = 300) -> str:
         "src/test/java", "src/test/resources",
         ".",
     ]
+    index = index or FileIndex(root)
     paths = []
     for base in roots:
-        p = (root / base)
-        if not p.exists(): continue
-        for f in p.rglob("*"):
-            if not f.is_file(): continue
+        for rel in index.files(base):
+            if rel in paths: continue
+            f = Path(rel)
             if (f.suffix.lower() in exts) or f.name in {"pom.xml", "specmatic.json", "specmatic.yaml"}:
-                rel = f.relative_to(root)
-                paths.append(str(rel))
+                paths.append(rel)
                 if len(paths) >= max_paths:
                     break
         if len(paths) >= max_paths:
             break
     return "\n".join(paths)
+
+
+def fingerprint_inputs(root: Path, rels: list[str], extra: str = "", index: FileIndex = None) -> str:
+    """
+    sha256 over (relative path, content hash) of every file under the given paths,
+    plus an extra string (e.g. the test command). Same inputs -> same fingerprint.
+    With an index, unchanged files reuse their stored hash instead of being re-read.
+    """
+    index = index or FileIndex(root)
+    h = hashlib.sha256(extra.encode("utf-8"))
+    for r in rels:
+        for rel in index.files(r):
+            h.update(rel.encode("utf-8") + b"\0" + index.sha(rel).encode("ascii") + b"\0")
+    return h.hexdigest()
+
+
+def harness_contracts(root: Path, cfg: dict, index: FileIndex = None) -> list[str]:
+    """
+    Spec paths the contract tests really run: config contract_paths when set, else the
+    contractPaths a test class under src/test/java sets (Specmatic prefers it to specmatic.yaml).
+    [] when neither says, i.e. specmatic.yaml decides.
+    """
+    given = cfg.get("contract_paths") or []
+    if given:
+        return [given] if isinstance(given, str) else [str(p) for p in given]
+    index = index or FileIndex(root)
+    for rel in index.files("src/test/java"):
+        if rel.endswith(".java"):
+            m = CONTRACT_PATHS.search(index.read(rel))
+            if m:
+                return [p.strip() for p in m.group(1).split(",") if p.strip()]
+    return []
+
+
+def text_chunk(path, kind, title, start, end, text) -> dict:
+    """A titled line range of one file, the unit retrieval.py indexes."""
+    return {"path": path, "kind": kind, "title": title, "start": start, "end": end, "text": text}
+
+def line_windows(path: str, kind: str, lines: list[str]) -> list[dict]:
+    """Fixed CHUNK_LINES-line chunks, for files without a structure we understand."""
+    return [text_chunk(path, kind, Path(path).name, i + 1, min(i + CHUNK_LINES, len(lines)),
+                       "\n".join(lines[i:i + CHUNK_LINES])) for i in range(0, len(lines), CHUNK_LINES)]
+
+def chunk_java(path: str, text: str) -> list[dict]:
+    """One chunk per method/constructor (with its annotations and javadoc), plus the class outline."""
+    lines = text.splitlines()
+    chunks, outline, depth = [], [], 0
+    type_decl, type_name = "", Path(path).stem
+    start = None        # index of the first line of the method being read
+    lead = []           # annotation/comment lines right above a member, at class-body depth
+    for i, line in enumerate(lines):
+        code = JAVA_NOISE.sub("", line)
+        if start is None:
+            m = JAVA_SIG.match(code)
+            if depth == 1 and m and m.group(1) not in NOT_METHODS and not code.rstrip().endswith(";"):
+                start = lead[0] if lead else i
+                name = m.group(1)
+                lead = []
+            elif depth == 1 and code.strip().startswith(("@", "/*", "*", "//")):
+                lead.append(i)
+            else:
+                outline.extend(lines[j] for j in lead)
+                outline.append(line)
+                lead = []
+                t = JAVA_TYPE.search(code)
+                if depth == 0 and t and not type_decl:
+                    type_decl, type_name = line.strip(), t.group(2)
+        depth += code.count("{") - code.count("}")
+        if start is not None and depth <= 1 and "{" in "".join(JAVA_NOISE.sub("", l) for l in lines[start:i + 1]):
+            body = "\n".join(lines[start:i + 1])
+            chunks.append(text_chunk(path, "code", f"{type_name}.{name}", start + 1, i + 1,
+                                     f"// in {type_decl or type_name}\n{body}"))
+            start = None
+    if start is not None:  # unbalanced braces: keep what's left as one chunk
+        chunks.append(text_chunk(path, "code", f"{type_name}.{name}", start + 1, len(lines), "\n".join(lines[start:])))
+    rest = "\n".join(l for l in outline if l.strip())
+    if rest:
+        chunks.insert(0, text_chunk(path, "code", f"{type_name} (outline)", 1, len(lines), rest))
+    return chunks or line_windows(path, "code", lines)
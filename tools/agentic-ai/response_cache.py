@@ -0,0 +1,102 @@
+import hashlib, json, os, threading, time
+from collections import OrderedDict
+from pathlib import Path
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses.
+    Key = sha256 of (model, prompt, options); one small JSON file per entry.
+    LRU eviction by file mtime (touched on every hit) once max_mb is exceeded,
+    and entries older than ttl_seconds are treated as misses (0 = never expire).
+    The last mem_entries responses are also kept in memory, which pays off in a long-lived process.
+    """
+
+    def __init__(self, cache_dir: Path, max_mb: float = 200, ttl_seconds: int = 7 * 24 * 3600,
+                 mem_entries: int = 256):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.ttl = int(ttl_seconds or 0)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.mem_entries = int(mem_entries or 0)
+        self._mem = OrderedDict()  # key -> (created, response)
+
+    @staticmethod
+    def key(model: str, prompt: str, options: dict) -> str:
+        blob = json.dumps({"model": model, "prompt": prompt, "options": options}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, created: float, response: str):
+        if not self.mem_entries:
+            return
+        with self._lock:
+            self._mem[key] = (created, response)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_entries:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry and not (self.ttl and time.time() - entry[0] > self.ttl):
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._mem.pop(key, None)
+        p = self._path(key)
+        try:
+            data = json.loads(p.read_text(encoding="utf-8"))
+            if self.ttl and time.time() - float(data.get("created", 0)) > self.ttl:
+                p.unlink(missing_ok=True)
+                data = None
+            else:
+                os.utime(p, None)  # LRU touch
+        except (OSError, ValueError):
+            data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if data:
+            self._remember(key, float(data.get("created", 0)), data.get("response"))
+        return data.get("response") if data else None
+
+    def put(self, key: str, response: str, model: str = ""):
+        if not response:
+            return
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{threading.get_ident()}.tmp")
+        created = time.time()
+        tmp.write_text(json.dumps({"model": model, "created": created, "response": response}),
+                       encoding="utf-8")
+        os.replace(tmp, p)
+        self._remember(key, created, response)
+        self._evict()
+
+    def _evict(self):
+        entries, total = [], 0
+        for f in self.dir.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, f in sorted(entries):
+            f.unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
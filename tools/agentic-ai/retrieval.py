@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Local retrieval index for prompt context: Java sources chunked per method, OpenAPI specs per
+operation (and per component schema), specmatic.yaml, and coding-standards docs per heading,
+ranked with BM25. No embedding model or extra dependency.
+
+The index lives in <output_dir>/retrieval_index.json and is updated incrementally: refresh()
+only re-chunks files whose content hash (from the shared FileIndex) changed. The agent queries
+it once per failure cluster, so each prompt carries the methods/operations for its failures
+instead of whole files in walk order.
+
+  python retrieval.py --config config.yaml                   # build/update the index offline
+  python retrieval.py --config config.yaml --query "POST /payments 201"
+"""
+import argparse, json, math, os, re, sys
+from collections import Counter
+from http import HTTPStatus
+from pathlib import Path
+import yaml
+from repo_utils import FileIndex, chunk_java, text_chunk, line_windows, CHUNK_LINES
+
+VERSION = 1
+K1, B = 1.2, 0.75
+
+WORD = re.compile(r"[A-Za-z0-9]+")
+CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+HTTP_METHODS = {"get", "put", "post", "delete", "patch", "head", "options", "trace"}
+DOC_SUFFIXES = {".md", ".txt", ".adoc", ".rst"}
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words, with camelCase / snake_case identifiers also split into their parts."""
+    out = []
+    for w in WORD.findall(text or ""):
+        low = w.lower()
+        out.append(low)
+        parts = CAMEL.findall(w)
+        if len(parts) > 1:
+            out.extend(p.lower() for p in parts)
+    return [t[:-1] if len(t) > 4 and t.endswith("s") and not t.endswith("ss") else t for t in out]
+
+def _yaml_children(lines: list[str], lo: int, hi: int) -> list[tuple[int, int]]:
+    """[start, end) line ranges of the direct children of the mapping spanning lines[lo:hi]."""
+    indent = None
+    starts = []
+    for i in range(lo, hi):
+        s = lines[i]
+        if not s.strip() or s.lstrip().startswith("#"):
+            continue
+        ind = len(s) - len(s.lstrip())
+        if indent is None:
+            indent = ind
+        if ind == indent and not s.lstrip().startswith("- "):
+            starts.append(i)
+        elif ind < indent:
+            hi = i
+            break
+    return [(s, e) for s, e in zip(starts, starts[1:] + [hi])]
+
+def _key(line: str) -> str:
+    return line.strip().split(":", 1)[0].strip("'\"")
+
+def chunk_openapi(path: str, text: str) -> list[dict]:
+    """One chunk per operation (path line + that method's block, original text) and per component schema."""
+    lines = text.splitlines()
+    top = {_key(lines[s]): (s, e) for s, e in _yaml_children(lines, 0, len(lines))}
+    chunks = []
+    if "paths" in top:
+        s, e = top["paths"]
+        for ps, pe in _yaml_children(lines, s + 1, e):
+            route = _key(lines[ps])
+            for ms, me in _yaml_children(lines, ps + 1, pe):
+                method = _key(lines[ms])
+                if method.lower() not in HTTP_METHODS:
+                    continue
+                chunks.append(text_chunk(path, "spec", f"{method.upper()} {route}", ms + 1, me,
+                                         lines[ps] + "\n" + "\n".join(lines[ms:me]).rstrip()))
+    if "components" in top:
+        s, e = top["components"]
+        for cs, ce in _yaml_children(lines, s + 1, e):
+            section = _key(lines[cs])
+            for xs, xe in _yaml_children(lines, cs + 1, ce):
+                chunks.append(text_chunk(path, "spec", f"{section}/{_key(lines[xs])}", xs + 1, xe,
+                                         "\n".join(lines[xs:xe]).rstrip()))
+    return chunks or line_windows(path, "spec", lines)
+
+def chunk_doc(path: str, text: str) -> list[dict]:
+    """Markdown-ish docs split at headings."""
+    lines = text.splitlines()
+    heads = [i for i, l in enumerate(lines) if l.startswith("#")] or [0]
+    if heads[0] != 0:
+        heads.insert(0, 0)
+    out = []
+    for s, e in zip(heads, heads[1:] + [len(lines)]):
+        body = "\n".join(lines[s:e]).strip()
+        if body:
+            out.append(text_chunk(path, "docs", lines[s].lstrip("# ").strip() or Path(path).name, s + 1, e, body))
+    return out
+
+def chunk_file(path: str, text: str, kind: str) -> list[dict]:
+    if kind == "spec":
+        return chunk_openapi(path, text)
+    if kind == "docs":
+        return chunk_doc(path, text) if Path(path).suffix.lower() in DOC_SUFFIXES else []
+    if kind == "config":
+        lines = text.splitlines()
+        return [text_chunk(path, "config", Path(path).name, 1, len(lines), text)] if len(lines) <= CHUNK_LINES \
+            else line_windows(path, "config", lines)
+    if path.endswith(".java"):
+        return chunk_java(path, text)
+    return []
+
+class RetrievalIndex:
+    """
+    BM25 over chunks of the files picked by `sources` (kind -> list of rel dirs/files; "spec"
+    also takes every .yaml/.yml/.json whose path contains spec_keyword).
+    """
+
+    def __init__(self, root: Path, index_path: Path = None, sources: dict = None, spec_keyword: str = "openapi",
+                 file_index: FileIndex = None):
+        self.root = Path(root)
+        self.index_path = Path(index_path) if index_path else None
+        self.sources = sources or {"code": ["src/main/java"], "config": ["specmatic.yaml"],
+                                   "docs": ["docs", "README.md", "CONTRIBUTING.md"]}
+        self.spec_keyword = spec_keyword
+        self.file_index = file_index or FileIndex(self.root)
+        self.files = {}     # rel -> {"sha", "kind", "chunks": [chunk, ...]}
+        self._stats = None  # (df, avg_len, n) cache, dropped on every change
+        if self.index_path and self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                if data.get("version") == VERSION and data.get("root") == str(self.root):
+                    self.files = data.get("files", {})
+            except ValueError:
+                pass
+
+    def _wanted(self) -> dict:
+        """rel -> kind for every file the sources select (first kind wins)."""
+        want = {}
+        for kind, rels in self.sources.items():
+            for r in rels or []:
+                for rel in self.file_index.files(r):
+                    want.setdefault(rel, kind)
+        kw = self.spec_keyword.lower()
+        for rel in self.file_index.files():
+            if Path(rel).suffix.lower() in {".yaml", ".yml", ".json"} and kw in rel.lower():
+                want[rel] = "spec"
+        return want
+
+    def refresh(self) -> set[str]:
+        """Re-chunks new/changed files, drops removed ones; returns the rel paths that changed."""
+        want, changed = self._wanted(), set()
+        for rel in set(self.files) - set(want):
+            del self.files[rel]
+            changed.add(rel)
+        for rel, kind in want.items():
+            sha = self.file_index.sha(rel)
+            old = self.files.get(rel)
+            if old and old["sha"] == sha and old["kind"] == kind:
+                continue
+            try:
+                text = self.file_index.read(rel)
+            except OSError:
+                continue
+            chunks = chunk_file(rel, text, kind)
+            for c in chunks:
+                tf = Counter(tokenize(f"{c['path']} {c['title']} {c['text']}"))
+                c["tf"], c["len"] = dict(tf), sum(tf.values())
+            self.files[rel] = {"sha": sha, "kind": kind, "chunks": chunks}
+            changed.add(rel)
+        if changed:
+            self._stats = None
+        return changed
+
+    def save(self):
+        if not self.index_path:
+            return
+        tmp = Path(str(self.index_path) + ".tmp")
+        tmp.write_text(json.dumps({"version": VERSION, "root": str(self.root), "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def chunks(self):
+        for entry in self.files.values():
+            yield from entry["chunks"]
+
+    def _corpus_stats(self):
+        if self._stats is None:
+            df, total, n = Counter(), 0, 0
+            for c in self.chunks():
+                df.update(c["tf"].keys())
+                total += c["len"]
+                n += 1
+            self._stats = (df, total / n if n else 0.0, n)
+        return self._stats
+
+    def search(self, query: str, k: int = 8, kinds: tuple = None) -> list[tuple[float, dict]]:
+        """Top-k (score, chunk) by BM25; chunks without a single query term are never returned."""
+        df, avg, n = self._corpus_stats()
+        terms = Counter(tokenize(query))
+        scored = []
+        for c in self.chunks():
+            if kinds and c["kind"] not in kinds:
+                continue
+            tf, s = c["tf"], 0.0
+            for t, qn in terms.items():
+                f = tf.get(t)
+                if not f:
+                    continue
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                s += qn * idf * f * (K1 + 1) / (f + K1 * (1 - B + B * c["len"] / (avg or 1)))
+            if s > 0:
+                scored.append((s, c))
+        scored.sort(key=lambda t: -t[0])
+        return scored[:k]
+
+def _status_words(code) -> str:
+    try:
+        return f"{code} {HTTPStatus(int(code)).name}"
+    except (TypeError, ValueError):
+        return ""
+
+def cluster_query(cluster) -> str:
+    """Query text for one failure cluster: endpoint, statuses (and their names), exception, first message line."""
+    ex = cluster.example
+    msg = next((l for l in (ex.message or ex.details or "").splitlines() if l.strip()), "")
+    return " ".join(x for x in (cluster.method, cluster.path.replace("(", " ").replace(")", " "),
+                                _status_words(cluster.expected_status), _status_words(cluster.actual_status),
+                                (cluster.exception or "").rsplit(".", 1)[-1], msg,
+                                *cluster.scenarios[:2]) if x)
+
+def label(chunk: dict) -> str:
+    return f"{chunk['path']}:{chunk['start']}-{chunk['end']} [{chunk['title']}]"
+
+def retrieve(index: RetrievalIndex, clusters: list, per_cluster: int = 8, kinds: tuple = None) -> list[tuple[str, str]]:
+    """
+    (label, text) pairs for the prompt: each cluster's top chunks, interleaved round-robin so every
+    cluster gets its best matches in before any cluster's tail; duplicates are kept once.
+    """
+    per = [index.search(cluster_query(c), per_cluster, kinds) for c in clusters]
+    out, seen = [], set()
+    for rank in range(per_cluster):
+        for hits in per:
+            if rank < len(hits):
+                c = hits[rank][1]
+                key = (c["path"], c["start"], c["title"])
+                if key not in seen:
+                    seen.add(key)
+                    out.append((label(c), c["text"]))
+    return out
+
+def from_config(cfg: dict, repo_root: Path, output_dir: Path, file_index: FileIndex = None) -> RetrievalIndex:
+    rc = cfg.get("retrieval", {}) or {}
+    sources = rc.get("sources") or None
+    if sources is None:
+        sources = {"code": ["src/main/java"], "config": [cfg.get("specmatic_config", "specmatic.yaml")],
+                   "docs": ["docs", "README.md", "CONTRIBUTING.md"]}
+    return RetrievalIndex(repo_root, output_dir / rc.get("file", "retrieval_index.json"), sources,
+                          spec_keyword=cfg.get("spec_keyword", "openapi"), file_index=file_index)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--query", help="Print the top chunks for this query after updating the index")
+    ap.add_argument("-k", type=int, default=8)
+    args = ap.parse_args()
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+    root = Path(cfg.get("repo_root", "../../")).resolve()
+    out = root / cfg.get("output_dir", ".agentic")
+    out.mkdir(parents=True, exist_ok=True)
+    fi = FileIndex(root, out / "file_index.json")
+    index = from_config(cfg, root, out, fi)
+    changed = index.refresh()
+    index.save()
+    fi.save()
+    print(f"{len(index.files)} files, {sum(1 for _ in index.chunks())} chunks ({len(changed)} file(s) re-indexed)")
+    if args.query:
+        for score, c in index.search(args.query, args.k):
+            print(f"{score:7.2f}  {label(c)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
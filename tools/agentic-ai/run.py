@@ -12,10 +12,67 @@ def main():
                     help="Smaller context + num_ctx for speed")
     ap.add_argument("--verbose", action="store_true",
                     help="Print extra debug info")
+    ap.add_argument("--parallel", action="store_true",
+                    help="Send independent LLM stages concurrently (see concurrency: in config)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Bypass the on-disk LLM response cache")
+    ap.add_argument("--no-analyzer", action="store_true",
+                    help="Skip the deterministic spec-vs-code analyzer (and always call the LLM stages)")
+    ap.add_argument("--no-memory", action="store_true",
+                    help="Don't reuse stored validated fixes for recurring failure signatures (see fix_memory: in config)")
+    ap.add_argument("--warm", action="store_true",
+                    help="Keep the app running between runs and test it with the Specmatic CLI (see warm_runner: in config)")
+    ap.add_argument("--force-tests", action="store_true",
+                    help="Re-run contract tests even if src/, specs and specmatic.yaml are unchanged")
+    ap.add_argument("--fail-fast", type=int, default=None, metavar="N",
+                    help="Stop the test run after N distinct failure signatures (see live_tests: in config)")
+    ap.add_argument("--only-failing", action="store_true",
+                    help="Re-run only the operations that failed last run (full suite if the filter can't apply)")
+    ap.add_argument("--tiered", action="store_true",
+                    help="Draft each stage on a small model and escalate only when checks reject it (see tiered: in config)")
+    ap.add_argument("--retrieval", action="store_true",
+                    help="Build prompt context from the BM25 chunk index, queried per failure cluster (see retrieval: in config)")
+    ap.add_argument("--fan-out", action="store_true",
+                    help="One focused diffs prompt per failing endpoint, run in parallel")
+    ap.add_argument("--validate", action="store_true",
+                    help="git apply --check each patch and run ContractTests for it in a git worktree")
+    ap.add_argument("--loop", action="store_true",
+                    help="Apply the best validated patch and iterate on the remaining failures until green")
+    ap.add_argument("--max-iterations", type=int, default=None, help="--loop budget (default loop.max_iterations)")
+    ap.add_argument("--max-minutes", type=float, default=None, help="--loop time budget")
+    ap.add_argument("--max-tokens", type=int, default=None, help="--loop token budget (0 = unlimited)")
+    ap.add_argument("--watch", action="store_true",
+                    help="Re-run on changes to src/main/java, the OpenAPI specs and specmatic.yaml (see watch: in config)")
+    ap.add_argument("--serve", action="store_true",
+                    help="Stay up and take runs over a local HTTP API (POST /run); see serve: in config")
+    ap.add_argument("--host", default=None, help="--serve bind address")
+    ap.add_argument("--port", type=int, default=None, help="--serve port")
+    ap.add_argument("--socket", default=None, help="--serve on this Unix socket instead of host/port")
     args = ap.parse_args()
 
-    agent = Agent(args.config, verbose=args.verbose)
-    result = agent.run_once(propose_patches=args.propose_patches)
+    agent_kwargs = dict(verbose=args.verbose, fast=args.fast or None,
+                        require_diffs=args.require_diffs or None, parallel=args.parallel or None,
+                        no_cache=args.no_cache, force_tests=args.force_tests, fan_out=args.fan_out or None,
+                        validate=args.validate, only_failing=args.only_failing or None,
+                        tiered=args.tiered or None, retrieve=args.retrieval or None,
+                        no_analyzer=args.no_analyzer, no_memory=args.no_memory,
+                        warm=args.warm or None, fail_fast=args.fail_fast)
+    if args.serve:
+        from agent_server import AgentServer
+        AgentServer(args.config, agent_kwargs, host=args.host, port=args.port,
+                    socket_path=args.socket, verbose=args.verbose).serve_forever()
+        return 0
+
+    agent = Agent(args.config, **agent_kwargs)
+    if args.watch:
+        from watcher import run_watch
+        return run_watch(agent, propose_patches=args.propose_patches)
+    if args.loop:
+        result = agent.run_loop(max_iterations=args.max_iterations,
+                                max_seconds=args.max_minutes * 60 if args.max_minutes else None,
+                                max_tokens=args.max_tokens)
+    else:
+        result = agent.run_once(propose_patches=args.propose_patches)
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import re
+
+# Specmatic reports path params as (name:type); its filter expressions use the spec's {name}
+_PARAM = re.compile(r"\((\w+):[^)]*\)")
+
+def spec_path(path: str) -> str:
+    return _PARAM.sub(r"{\1}", path or "")
+
+def specmatic_filter(failures: list) -> str:
+    """
+    Specmatic filter expression selecting only the failing scenarios, e.g.
+      (METHOD='POST' && PATH='/payments' && STATUS='201') || (...)
+    Empty string when no failure carries an endpoint (nothing to filter on).
+    """
+    clauses = []
+    for f in failures:
+        if not f.method:
+            continue
+        parts = [f"METHOD='{f.method}'", f"PATH='{spec_path(f.path)}'"]
+        if f.expected_status:
+            parts.append(f"STATUS='{f.expected_status}'")
+        clause = "(" + " && ".join(parts) + ")"
+        if clause not in clauses:
+            clauses.append(clause)
+    return " || ".join(clauses)
+
+def filter_args(expr: str) -> list[str]:
+    """Extra test-command args that hand the filter to Specmatic (surefire forwards -D to the test JVM)."""
+    return [f"-Dfilter={expr}"] if expr else []
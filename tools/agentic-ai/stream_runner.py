@@ -0,0 +1,63 @@
+import os, signal, subprocess, threading
+from collections import deque
+from pathlib import Path
+
+TAIL_LINES = 200
+
+def tail(path: Path, max_chars: int = 8000) -> str:
+    """Last max_chars of a (possibly huge) log file, without reading the rest."""
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            fh.seek(max(0, fh.tell() - max_chars))
+            return fh.read().decode("utf-8", errors="ignore")
+    except OSError:
+        return ""
+
+def _pump(stream, path: Path, keep: deque, on_line=None):
+    with open(path, "w", encoding="utf-8") as out:
+        for line in stream:
+            out.write(line)
+            out.flush()  # readers (tail -f, a crashed run's post-mortem) see it as it happens
+            keep.append(line)
+            if on_line:
+                on_line(line)
+
+def run_streaming(args: list, cwd: Path, stdout_path: Path, stderr_path: Path, on_line=None,
+                  should_stop=None, env: dict = None) -> dict:
+    """
+    Runs a test command with stdout/stderr written to disk line by line instead of buffered in
+    memory; on_line(line) sees every stdout line as it arrives (on the reader thread).
+    should_stop() is polled a few times a second: a non-empty reason kills the whole process
+    group (Maven's forked test JVM included). Returns {"exit", "stdout", "stderr", "stopped"},
+    stdout/stderr being only the last TAIL_LINES lines.
+    """
+    try:
+        proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                errors="replace", bufsize=1, env=env, start_new_session=True)
+    except Exception as e:
+        Path(stderr_path).write_text(f"SHELL_ERROR: {e}", encoding="utf-8")
+        return {"exit": 1, "stdout": "", "stderr": f"SHELL_ERROR: {e}", "stopped": None}
+
+    out_tail, err_tail = deque(maxlen=TAIL_LINES), deque(maxlen=TAIL_LINES)
+    readers = [threading.Thread(target=_pump, args=(proc.stdout, stdout_path, out_tail, on_line), daemon=True),
+               threading.Thread(target=_pump, args=(proc.stderr, stderr_path, err_tail), daemon=True)]
+    for t in readers:
+        t.start()
+    stopped = None
+    while True:
+        try:
+            proc.wait(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            stopped = should_stop() if should_stop else None
+            if stopped:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    proc.kill()
+                proc.wait()
+                break
+    for t in readers:
+        t.join()
+    return {"exit": proc.returncode, "stdout": "".join(out_tail), "stderr": "".join(err_tail), "stopped": stopped}
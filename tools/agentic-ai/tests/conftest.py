@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the tools are flat scripts run from tools/agentic-ai, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
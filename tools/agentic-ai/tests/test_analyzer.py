@@ -0,0 +1,90 @@
+from pathlib import Path
+from analyzer import (ACCEPTS_INVALID, NOT_FOUND_DATA, REJECTS_VALID, Finding, analyze, contract_specs,
+                      index_spec, norm_path)
+from clustering import cluster_failures
+from parser import console_failures, parse_reports
+from repo_utils import harness_contracts
+
+ROOT = Path(__file__).resolve().parents[3]
+FIXTURES = Path(__file__).resolve().parents[1] / "bench_fixtures"
+SIMPLE = "src/main/resources/openapi/simple-payments.yaml"
+FULL = "src/main/resources/openapi/payments.yaml"
+
+def _files(base: str, pattern: str) -> list[tuple[str, str]]:
+    return [(p.relative_to(ROOT).as_posix(), p.read_text(encoding="utf-8")) for p in sorted((ROOT / base).rglob(pattern))]
+
+JAVA = _files("src/main/java", "*.java")
+SPECS = _files("src/main/resources/openapi", "*.yaml")
+
+def _kinds(a) -> set:
+    return {(f.kind, f.effect, f.endpoint, f.subject, f.absent) for f in a.findings}
+
+def _console_failures():
+    with open(FIXTURES / "test_stdout.txt", encoding="utf-8") as fh:
+        return console_failures(fh)
+
+def _clusters():
+    reports = parse_reports(FIXTURES / "surefire-reports", FIXTURES / "test_stdout.txt")
+    return cluster_failures(reports.failures)
+
+# ---------------- contract resolution ------------------------------
+
+def test_harness_runs_simple_payments_though_specmatic_yaml_names_payments():
+    assert contract_specs((ROOT / "specmatic.yaml").read_text(encoding="utf-8")) == [FULL]
+    assert harness_contracts(ROOT, {}) == [SIMPLE]
+    assert harness_contracts(ROOT, {"contract_paths": [FULL]}) == [FULL]
+
+def test_spec_index_normalizes_paths_and_reads_operations():
+    ops, schemas = index_spec(SIMPLE, dict(SPECS)[SIMPLE])
+    assert {(o.method, norm_path(o.path)) for o in ops} == {("POST", "/payments"), ("GET", "/payments/{}")}
+    assert "PaymentRequest" in schemas
+    assert norm_path("/payments/(id:string)") == norm_path("/payments/{id}") == "/payments/{}"
+
+# ---------------- findings per spec ------------------------------
+
+def test_simple_payments_findings():
+    a = analyze(SPECS, JAVA, [SIMPLE])
+    assert (a.operations, a.handlers) == (2, 2)
+    assert _kinds(a) == {
+        ("constraint", REJECTS_VALID, "POST /payments", "amount", False),      # minimum 0.01 vs @Min(1)
+        ("constraint", ACCEPTS_INVALID, "POST /payments", "currency", False),  # min/maxLength 3, unchecked
+        ("test-data", NOT_FOUND_DATA, "GET /payments/{id}", "", False),
+    }
+
+def test_payments_yaml_also_flags_its_required_idempotency_key():
+    extra = _kinds(analyze(SPECS, JAVA, [FULL])) - _kinds(analyze(SPECS, JAVA, [SIMPLE]))
+    assert extra == {("header", ACCEPTS_INVALID, "POST /payments", "Idempotency-Key", True)}
+
+def test_contracts_found_nowhere_locally_fall_back_to_every_spec():
+    assert _kinds(analyze(SPECS, JAVA, ["registry/other.yaml"])) >= _kinds(analyze(SPECS, JAVA, [FULL]))
+
+# ---------------- which failures a finding explains ------------------------------
+
+def test_console_records_carry_the_failing_request():
+    failures = _console_failures()
+    assert len(failures) == 13
+    post = next(f for f in failures if f.method == "POST")
+    assert '"amount": 0.01' in post.request and "Idempotency-Key:" in post.request
+
+def test_field_findings_need_a_failing_request_to_explain_anything():
+    a = analyze(SPECS, JAVA, [SIMPLE]).explain(_clusters())
+    assert not a.fully_explained  # POST 201->400: nothing shows which field the 400 was about
+    assert [a.findings[i].effect for hits in a.explained.values() for i in hits] == [NOT_FOUND_DATA]
+
+def test_console_requests_tie_the_400s_to_the_amount_constraint():
+    clusters = _clusters()
+    a = analyze(SPECS, JAVA, [SIMPLE]).explain(clusters, _console_failures())
+    assert a.fully_explained
+    post = next(c for c in clusters if c.method == "POST")
+    assert [a.findings[i].subject for i in a.explained[post.key]] == ["amount"]
+
+def test_subject_has_to_be_sent_or_omitted_as_the_finding_says():
+    request = next(f for f in _console_failures() if f.method == "POST").request
+    finding = lambda subject, absent=False: Finding("constraint", REJECTS_VALID, "POST /payments", "", "",
+                                                    subject=subject, absent=absent)
+    assert finding("amount").explains("POST", "/payments", 201, 400, [request])
+    assert not finding("fee").explains("POST", "/payments", 201, 400, [request])
+    assert finding("fee", absent=True).explains("POST", "/payments", 201, 400, [request])
+    assert not finding("idempotency-key", absent=True).explains("POST", "/payments", 201, 400, [request])
+    assert not finding("amount").explains("POST", "/payments", 201, 400, [])
+    assert not finding("amount").explains("GET", "/payments/{id}", 200, 400, [request])
@@ -0,0 +1,113 @@
+import subprocess
+from diff_utils import DiffStream, HUNK, _locate, _parse_hunk, extract_unified_diffs, repair_diff
+
+GREETER = "src/main/java/demo/Greeter.java"
+JAVA = """package demo;
+
+public class Greeter {
+    public String greet(String name) {
+        if (name == null) {
+            return "hello";
+        }
+        return "hello " + name;
+    }
+}
+"""
+
+def _repo(tmp_path):
+    f = tmp_path / GREETER
+    f.parent.mkdir(parents=True)
+    f.write_text(JAVA, encoding="utf-8")
+    return tmp_path
+
+def _headers(diff: str) -> list[str]:
+    return [m.group(0) for m in HUNK.finditer(diff)]
+
+def _applies(root, diff: str) -> bool:
+    p = root / "fix.diff"
+    p.write_text(diff + "\n", encoding="utf-8")
+    return subprocess.run(["git", "apply", "--check", p.name], cwd=root, capture_output=True).returncode == 0
+
+# ---------------- repair_diff: hunk-header recount ------------------------------
+
+def test_repair_recounts_hunk_headers_and_new_side_offsets():
+    diff = "--- a/x.txt\n+++ b/x.txt\n@@ -1,9 +1,9 @@\n a\n-b\n+B\n+B2\n c\n@@ -10,2 +10,2 @@\n x\n-y\n"
+    assert _headers(repair_diff(diff)) == ["@@ -1,3 +1,4 @@", "@@ -10,2 +11,1 @@"]
+
+def test_repair_restores_context_lines_that_lost_their_space():
+    out = repair_diff("--- a/x.txt\n+++ b/x.txt\n@@ -1 +1 @@\na\n-b\n+c\n")
+    assert out.splitlines()[2:] == ["@@ -1,2 +1,2 @@", " a", "-b", "+c"]
+
+def test_repair_counts_a_new_file_from_zero():
+    out = repair_diff("--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,7 @@\n+x\n+y\n")
+    assert _headers(out) == ["@@ -0,0 +1,2 @@"]
+
+def test_repair_reanchors_a_hunk_with_the_wrong_line_number(tmp_path):
+    root = _repo(tmp_path)
+    diff = (f"--- a/{GREETER}\n+++ b/{GREETER}\n@@ -1,3 +1,3 @@\n"
+            '         if (name == null) {\n-            return "hello";\n+            return "hello, stranger";\n         }')
+    out = repair_diff(diff, root)
+    assert _headers(out) == ["@@ -5,3 +5,3 @@"]
+    assert _applies(root, out)
+
+# ---------------- _locate: headerless diffs ------------------------------
+
+HEADERLESS = ("@@ -4,2 +4,2 @@\n     public String greet(String name) {\n"
+              "-        if (name == null) {\n+        if (name == null || name.isBlank()) {")
+
+def test_locate_finds_the_one_file_holding_the_old_lines(tmp_path):
+    assert _locate(_repo(tmp_path), [_parse_hunk(HEADERLESS)]) == GREETER
+
+def test_locate_gives_up_when_the_lines_are_ambiguous(tmp_path):
+    root = _repo(tmp_path)
+    (root / "src/main/java/demo/Copy.java").write_text(JAVA, encoding="utf-8")
+    assert _locate(root, [_parse_hunk(HEADERLESS)]) == ""
+    assert repair_diff(HEADERLESS, root).startswith("@@")
+
+def test_repair_gives_a_located_headerless_diff_its_headers(tmp_path):
+    root = _repo(tmp_path)
+    out = repair_diff(HEADERLESS, root)
+    assert out.splitlines()[:2] == [f"--- a/{GREETER}", f"+++ b/{GREETER}"]
+    assert _applies(root, out)
+
+# ---------------- DiffStream: fence handling ------------------------------
+
+TWO_FILES = ("Here you go:\n```diff\n--- a/a.txt\n+++ b/a.txt\n@@ -1 +1 @@\n-a\n+A\n"
+             "--- a/b.txt\n+++ b/b.txt\n@@ -1 +1 @@\n-b\n+B\n```")
+
+def test_one_fence_with_several_files_is_split_per_file():
+    diffs = extract_unified_diffs(TWO_FILES + "\nThat's all.")
+    assert list(diffs) == ["a.txt", "b.txt"]
+    assert diffs["b.txt"].splitlines() == ["--- a/b.txt", "+++ b/b.txt", "@@ -1,1 +1,1 @@", "-b", "+B"]
+
+def test_stream_emits_each_file_as_soon_as_it_ends():
+    stream, emitted = DiffStream(), []
+    for i, ch in enumerate(TWO_FILES):  # one character at a time, like a token stream
+        emitted += [(i, path) for path, _ in stream.feed(ch)]
+    assert [p for _, p in emitted] == ["a.txt", "b.txt"]
+    assert emitted[0][0] < TWO_FILES.index("@@", TWO_FILES.index("b.txt"))  # at b.txt's headers
+    assert emitted[1][0] == len(TWO_FILES) - 1  # closing fence, no newline after it yet
+
+def test_removed_line_starting_with_dashes_is_not_a_header():
+    diffs = extract_unified_diffs("```diff\n--- a/q.sql\n+++ b/q.sql\n@@ -1,2 +1 @@\n--- note\n select 1;\n```")
+    assert list(diffs) == ["q.sql"]
+    assert diffs["q.sql"].splitlines()[2:] == ["@@ -1,2 +1,1 @@", "--- note", " select 1;"]
+
+def test_text_outside_diff_fences_is_ignored():
+    text = "```java\n--- a/x.txt\n+++ b/x.txt\n@@ -1 +1 @@\n-x\n+y\n```\n```diffstat\n@@ -1 +1 @@\n```"
+    assert extract_unified_diffs(text) == {}
+
+def test_headerless_diff_without_a_repo_gets_an_unknown_key():
+    diffs = extract_unified_diffs("```diff\n@@ -1 +1 @@\n-x\n+y\n```")
+    assert list(diffs) == ["unknown_1.diff"]
+
+def _fence(line: int, old: str, new: str) -> str:
+    return f"```diff\n--- a/f.txt\n+++ b/f.txt\n@@ -{line},1 +{line},1 @@\n-{old}\n+{new}\n```\n"
+
+def test_repeated_file_merges_disjoint_hunks_and_keeps_the_first_of_overlapping_ones():
+    stream = DiffStream()
+    stream.feed(_fence(1, "a", "A") + _fence(5, "e", "E"))
+    assert _headers(stream.merged["f.txt"]) == ["@@ -1,1 +1,1 @@", "@@ -5,1 +5,1 @@"]
+    assert stream.feed(_fence(1, "a", "X")) == []
+    assert [path for path, _ in stream.conflicts] == ["f.txt"]
+    assert "+X" not in stream.merged["f.txt"]
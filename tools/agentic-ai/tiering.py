@@ -0,0 +1,96 @@
+"""
+Tiered generation: a small draft model answers first, cheap checks (or the critic model) judge
+the draft, and only rejected drafts are regenerated by the stage's full model.
+
+Structural checks per stage:
+  diffs            ```diff blocks with ---/+++ headers and @@ hunks that `git apply --check`
+  api              some code block (diff or // FILE: java) that passes the diff checks above
+  spec, specmatic  every ```yaml block parses; any diffs pass the diff checks
+  summary          non-trivial, and mentions at least one failing endpoint path
+"""
+import pathlib, re, tempfile
+import yaml
+from diff_utils import BLOCK, HUNK, extract_unified_diffs, has_any_code, is_unknown_path
+from validate_patches import check_patch
+
+YAML_BLOCK = re.compile(r"```ya?ml[^\n]*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+
+def check_diffs(text: str, repo_root: pathlib.Path = None, required: bool = True) -> tuple[bool, str]:
+    if not BLOCK.search(text or ""):
+        return (not required), "no ```diff blocks"
+    diffs = extract_unified_diffs(text, repo_root)
+    if not diffs or any(is_unknown_path(p) for p in diffs):
+        return False, "diff without ---/+++ headers"
+    for path, diff in diffs.items():
+        if not HUNK.search(diff):
+            return False, f"{path}: no @@ hunk"
+    if repo_root:
+        with tempfile.TemporaryDirectory(prefix="agentic-tier-") as tmp:
+            for i, (path, diff) in enumerate(diffs.items()):
+                p = pathlib.Path(tmp) / f"draft_{i:02d}.diff"
+                p.write_text(diff.rstrip("\n") + "\n", encoding="utf-8")
+                res = check_patch(repo_root, p)
+                if not res["applies"]:
+                    return False, f"{path}: git apply --check failed ({res['checkError'].splitlines()[0] if res['checkError'] else '?'})"
+    return True, f"{len(diffs)} diff(s) apply"
+
+def check_yaml(text: str, repo_root: pathlib.Path = None) -> tuple[bool, str]:
+    blocks = YAML_BLOCK.findall(text or "")
+    for i, block in enumerate(blocks, 1):
+        try:
+            yaml.safe_load(block)
+        except yaml.YAMLError as e:
+            return False, f"yaml block {i} does not parse: {str(e).splitlines()[0]}"
+    ok, why = check_diffs(text, repo_root, required=False)
+    if not ok:
+        return ok, why
+    if not blocks and not BLOCK.search(text or ""):
+        return False, "no ```yaml or ```diff blocks"
+    return True, f"{len(blocks)} yaml block(s) parse"
+
+def check_code(text: str, repo_root: pathlib.Path = None) -> tuple[bool, str]:
+    if not has_any_code(text):
+        return False, "no diff or // FILE: code block"
+    return check_diffs(text, repo_root, required=False)
+
+def check_summary(text: str, endpoints: list = None) -> tuple[bool, str]:
+    text = (text or "").strip()
+    if len(text) < 40:
+        return False, "summary too short"
+    paths = {p.split("(")[0].split("{")[0].rstrip("/") for _, p in endpoints or [] if p}
+    if paths and not any(p and p in text for p in paths):
+        return False, "mentions none of the failing endpoints"
+    return True, "ok"
+
+def check_stage(stage: str, text: str, repo_root: pathlib.Path = None, endpoints: list = None) -> tuple[bool, str]:
+    """(accepted, reason) for a draft of one stage's output."""
+    if stage == "summary":
+        return check_summary(text, endpoints)
+    if stage == "api":
+        return check_code(text, repo_root)
+    if stage in ("spec", "specmatic"):
+        return check_yaml(text, repo_root)
+    if stage == "diffs":
+        return check_diffs(text, repo_root)
+    return bool((text or "").strip()), "empty output"
+
+def critic_prompt(stage: str, prompt: str, draft: str, max_chars: int = 6000) -> str:
+    return f"""
+You are a strict reviewer. Another model answered the TASK below with the DRAFT.
+Reply with exactly one line: PASS if the draft is correct, complete and follows the task's output rules,
+otherwise FAIL: <one-sentence reason>.
+
+TASK ({stage}):
+{prompt[-max_chars:]}
+
+DRAFT:
+{draft[:max_chars]}
+"""
+
+def parse_verdict(text: str) -> tuple[bool, str]:
+    """First word of the critic's answer decides; anything but PASS is a rejection."""
+    line = next((l.strip() for l in (text or "").splitlines() if l.strip()), "")
+    word = re.sub(r"[^A-Za-z]", "", line.split()[0]).upper() if line else ""
+    if word == "PASS":
+        return True, "critic: PASS"
+    return False, "critic: " + (line[:200] or "no verdict")
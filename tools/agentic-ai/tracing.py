@@ -0,0 +1,139 @@
+import json, os, threading, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: str, attrs: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = {}
+        self.set(**attrs)
+        self.start = time.time()
+        self.seconds = 0.0
+        self.status = "ok"
+        self.error = ""
+
+    def set(self, **attrs):
+        self.attrs.update({k: v for k, v in attrs.items() if v is not None})
+        return self
+
+    def to_dict(self) -> dict:
+        d = {"trace": self.trace_id, "span": self.span_id, "parent": self.parent_id, "name": self.name,
+             "start": round(self.start, 3), "seconds": round(self.seconds, 4), "status": self.status,
+             "thread": threading.current_thread().name, "attrs": self.attrs}
+        if self.error:
+            d["error"] = self.error
+        return d
+
+# attrs summed into Prometheus counters, per stage
+COUNTERS = {
+    "prompt_eval_count": ("agentic_llm_prompt_tokens_total", "Prompt tokens evaluated by the model"),
+    "eval_count":        ("agentic_llm_completion_tokens_total", "Tokens generated by the model"),
+    "eval_seconds":      ("agentic_llm_eval_seconds_total", "Model generation time reported by Ollama"),
+    "cache_hit":         ("agentic_llm_cache_hits_total", "LLM calls answered from the response cache"),
+    "retries":           ("agentic_llm_retries_total", "Retried Ollama requests"),
+}
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Tracer:
+    """
+    Spans for every agent stage, appended as JSON lines to trace_path (one line per finished span,
+    so a crashed run still leaves everything up to the crash). Spans nest via a per-thread stack;
+    spans opened on worker threads hang off the run's root span. Durations and LLM counters are
+    also aggregated per stage and can be dumped in Prometheus text format for a textfile collector.
+    """
+
+    def __init__(self, trace_path: Path = None, metrics_path: Path = None, service: str = "", enabled: bool = True):
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.service = service
+        self.enabled = enabled
+        self.trace_id = uuid.uuid4().hex
+        self._root = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._durations = {}   # (span, stage) -> [count, seconds]
+        self._counters = {}    # (metric, stage) -> value
+        self._errors = {}      # span -> count
+
+    def new_trace(self) -> str:
+        self.trace_id = uuid.uuid4().hex
+        return self.trace_id
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else self._root
+        sp = Span(name, self.trace_id, parent.span_id if parent else None, attrs)
+        if parent is None:
+            self._root = sp
+        stack.append(sp)
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as e:
+            sp.status, sp.error = "error", f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            sp.seconds = time.perf_counter() - t0
+            stack.pop()
+            if self._root is sp:
+                self._root = None
+            self._finish(sp)
+
+    def _finish(self, sp: Span):
+        if not self.enabled:
+            return
+        stage = str(sp.attrs.get("stage", sp.name))
+        line = json.dumps({"service": self.service, **sp.to_dict()}, default=str)
+        with self._lock:
+            d = self._durations.setdefault((sp.name, stage), [0, 0.0])
+            d[0] += 1
+            d[1] += sp.seconds
+            for attr, (metric, _) in COUNTERS.items():
+                v = sp.attrs.get(attr)
+                if v:
+                    self._counters[(metric, stage)] = self._counters.get((metric, stage), 0) + float(v)
+            if sp.status == "error":
+                self._errors[sp.name] = self._errors.get(sp.name, 0) + 1
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+
+    def prometheus_text(self) -> str:
+        def labels(**kv):
+            kv = {"service": self.service, **kv}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items()) + "}"
+
+        with self._lock:
+            out = ["# HELP agentic_span_seconds Wall time per agent stage",
+                   "# TYPE agentic_span_seconds summary"]
+            for (name, stage), (count, secs) in sorted(self._durations.items()):
+                out.append(f"agentic_span_seconds_sum{labels(span=name, stage=stage)} {secs:.4f}")
+                out.append(f"agentic_span_seconds_count{labels(span=name, stage=stage)} {count}")
+            for attr, (metric, help_text) in COUNTERS.items():
+                rows = sorted((stage, v) for (m, stage), v in self._counters.items() if m == metric)
+                if rows:
+                    out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                    out += [f"{metric}{labels(stage=stage)} {v:g}" for stage, v in rows]
+            if self._errors:
+                out += ["# HELP agentic_span_errors_total Stages that raised", "# TYPE agentic_span_errors_total counter"]
+                out += [f"agentic_span_errors_total{labels(span=n)} {c}" for n, c in sorted(self._errors.items())]
+        return "\n".join(out) + "\n"
+
+    def write_metrics(self):
+        """Atomic rewrite, so a node_exporter textfile collector never reads half a file."""
+        if not (self.enabled and self.metrics_path):
+            return
+        tmp = self.metrics_path.with_suffix(self.metrics_path.suffix + ".tmp")
+        tmp.write_text(self.prometheus_text(), encoding="utf-8")
+        os.replace(tmp, self.metrics_path)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Validates candidate patches before anyone applies them:
+  1) `git apply --check` every *.diff in parallel against the current working tree
+  2) for each patch that applies, build + run the contract tests in its own `git worktree`
+     (bounded pool, each run on its own port) and count the remaining failures
+  3) rank patches by how many of the baseline failures they fix
+"""
+import argparse, json, os, pathlib, shutil, socket, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from parser import parse_reports
+
+def git(args, cwd, env=None):
+    p = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True,
+                       env={**os.environ, **env} if env else None)
+    return p.returncode, p.stdout, p.stderr
+
+def check_patch(repo: pathlib.Path, patch: pathlib.Path) -> dict:
+    ret, _, err = git(["apply", "--check", str(patch.resolve())], repo)
+    return {"patch": patch.name, "applies": ret == 0, "checkError": err.strip()}
+
+def base_commit(repo: pathlib.Path) -> str:
+    """
+    Commit holding the current working tree, without touching it or the real index: tracked
+    changes plus untracked, non-ignored files (e.g. ones a --loop iteration's patch created,
+    which `git stash create` would leave out).
+    """
+    with tempfile.TemporaryDirectory(prefix="agentic-index-") as tmp:
+        env = {"GIT_INDEX_FILE": str(pathlib.Path(tmp) / "index"),
+               "GIT_AUTHOR_NAME": "agentic", "GIT_AUTHOR_EMAIL": "agentic@localhost",
+               "GIT_COMMITTER_NAME": "agentic", "GIT_COMMITTER_EMAIL": "agentic@localhost"}
+        ret, _, _ = git(["read-tree", "HEAD"], repo, env)
+        if ret == 0 and git(["add", "-A"], repo, env)[0] == 0:
+            ret, tree, _ = git(["write-tree"], repo, env)
+            if ret == 0:
+                ret, out, _ = git(["commit-tree", tree.strip(), "-p", "HEAD", "-m", "agentic validation base"], repo, env)
+                if ret == 0:
+                    return out.strip()
+    _, out, _ = git(["stash", "create"], repo)
+    if out.strip():
+        return out.strip()
+    _, out, _ = git(["rev-parse", "HEAD"], repo)
+    return out.strip()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_tests_in_worktree(repo: pathlib.Path, base: str, patch: pathlib.Path, cfg: dict,
+                          keep: bool = False, extra_args: list = None) -> dict:
+    wt = pathlib.Path(tempfile.mkdtemp(prefix="agentic-wt-"))
+    res = {"patch": patch.name, "worktree": str(wt)}
+    t0 = time.time()
+    try:
+        ret, _, err = git(["worktree", "add", "--detach", str(wt), base], repo)
+        if ret != 0:
+            return {**res, "error": f"worktree add failed: {err.strip()}"}
+        ret, _, err = git(["apply", str(patch.resolve())], wt)
+        if ret != 0:
+            return {**res, "error": f"apply failed in worktree: {err.strip()}"}
+
+        cmd = cfg["test_command"]
+        args = list(cmd) if isinstance(cmd, list) else cmd.split()
+        args += list(extra_args or []) + [f"-Dcontract.port={free_port()}"]
+        proc = subprocess.run(args, cwd=wt, capture_output=True, text=True)
+        surefire = wt / cfg["surefire_dir"]
+        reports = parse_reports(surefire, surefire.parent / cfg.get("specmatic_log", "specmatic.log"))
+        if not reports.suites:
+            # nothing ran: compile error or similar; don't count that as "0 failures"
+            return {**res, "exit": proc.returncode, "error": "no test reports (build failed?)",
+                    "stderrTail": proc.stderr[-2000:], "seconds": round(time.time() - t0, 1)}
+        return {**res, "exit": proc.returncode, "remainingFailures": len(reports.failures),
+                "failingTests": [f.testcase for f in reports.failures],
+                "failures": [{k: v for k, v in f.to_dict().items() if k != "details"} for f in reports.failures],
+                "seconds": round(time.time() - t0, 1)}
+    finally:
+        if not keep:
+            git(["worktree", "remove", "--force", str(wt)], repo)
+            shutil.rmtree(wt, ignore_errors=True)
+
+def best_patch(results: list[dict]):
+    """Top-ranked result that applies, ran cleanly and fixed at least one failure (or None)."""
+    for r in results:
+        if r.get("applies") and not r.get("error") and (r.get("fixed") or 0) > 0:
+            return r
+    return None
+
+def rank(results: list[dict], baseline_failures: int) -> list[dict]:
+    for r in results:
+        if "remainingFailures" in r and baseline_failures is not None:
+            r["fixed"] = baseline_failures - r["remainingFailures"]
+    def key(r):
+        tested = "remainingFailures" in r
+        return (not r.get("applies"), not tested, -(r.get("fixed") or 0), r.get("remainingFailures", 10**9))
+    return sorted(results, key=key)
+
+def validate(repo: pathlib.Path, patch_dir: pathlib.Path, cfg: dict, baseline_failures: int = None,
+             run_tests: bool = True, verbose: bool = False, extra_args: list = None) -> list[dict]:
+    vcfg = cfg.get("validation", {}) or {}
+    patches = sorted(patch_dir.glob("*.diff"))
+    if not patches:
+        return []
+
+    with ThreadPoolExecutor(max_workers=int(vcfg.get("check_workers", 8))) as pool:
+        checks = list(pool.map(lambda p: check_patch(repo, p), patches))
+    by_name = {c["patch"]: c for c in checks}
+    if verbose:
+        print(f"[DEBUG] git apply --check: {sum(c['applies'] for c in checks)}/{len(checks)} apply")
+
+    survivors = [p for p in patches if by_name[p.name]["applies"]]
+    if run_tests and survivors:
+        base = base_commit(repo)
+        keep = bool(vcfg.get("keep_worktrees", False))
+        with ThreadPoolExecutor(max_workers=int(vcfg.get("test_workers", 2))) as pool:
+            for r in pool.map(lambda p: run_tests_in_worktree(repo, base, p, cfg, keep, extra_args), survivors):
+                by_name[r["patch"]].update(r)
+                if verbose:
+                    print(f"[DEBUG] {r['patch']}: remaining={r.get('remainingFailures')} {r.get('error', '')}")
+        git(["worktree", "prune"], repo)
+
+    return rank(list(by_name.values()), baseline_failures)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("patch_dir", help="Directory containing *.diff")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--check-only", action="store_true", help="Only run git apply --check")
+    ap.add_argument("--baseline", type=int, default=None,
+                    help="Failure count before patching (default: from failures.json next to patch_dir)")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+    repo = pathlib.Path(cfg.get("repo_root", "../../")).resolve()
+    patch_dir = pathlib.Path(args.patch_dir)
+
+    baseline = args.baseline
+    failures_json = patch_dir.parent / "failures.json"
+    if baseline is None and failures_json.exists():
+        baseline = len(json.loads(failures_json.read_text(encoding="utf-8")))
+
+    results = validate(repo, patch_dir, cfg, baseline, run_tests=not args.check_only, verbose=args.verbose)
+    (patch_dir.parent / "validation.json").write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Warm test runner: keeps the service running between agent runs and points the Specmatic CLI
+at it, instead of paying for Maven, a Spring Boot context and spec loading on every run.
+
+  - the app is built and (re)started only when its inputs (Java sources, pom.xml, application
+    config) change; spec-only or specmatic.yaml edits reuse the running process as-is
+  - the process is detached and its pid (plus start time, so a reused pid is never signalled),
+    port and fingerprint kept in <output_dir>/warm_app.json; a later one-shot `run.py --warm`
+    finds it still up
+  - each run is one `specmatic test` against it, on the same contracts as ContractTests
+    (contract_paths, else its contractPaths, else specmatic.yaml), writing JUnit XML into
+    surefire_dir and its console output to specmatic_log, i.e. exactly what parser.py reads
+    after a `mvnw test`
+
+  python warm_runner.py            # start (or reuse) the app and run the contract tests once
+  python warm_runner.py --status
+  python warm_runner.py --stop
+"""
+import argparse, glob, json, os, shlex, shutil, signal, subprocess, sys, time, urllib.error, urllib.request
+from pathlib import Path
+from colorama import Fore, Style
+import yaml
+from repo_utils import FileIndex, fingerprint_inputs, harness_contracts
+from stream_runner import run_streaming, tail
+
+DEFAULTS = {
+    "port": 8090,
+    "app_inputs": ["src/main/java", "src/main/resources/application.properties",
+                   "src/main/resources/application.yml", "src/main/resources/application.yaml", "pom.xml"],
+    "build_command": "./mvnw -q -DskipTests package",
+    "jar": "target/*.jar",
+    "start_command": "java -jar {jar} --server.port={port}",
+    "ready_path": "/",
+    "start_timeout": 120,
+    "specmatic_command": "java -jar {specmatic_jar} test --testBaseURL={base_url} --junitReportDir={reports}",
+    "specmatic_jar": "~/.specmatic/specmatic.jar",
+    "env": {"SPECMATIC_GENERATIVE_TESTS": "false"},
+}
+
+def _args(cmd, **fmt) -> list[str]:
+    args = list(cmd) if isinstance(cmd, list) else shlex.split(cmd)
+    return [a.format(**fmt) for a in args]
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def _identity(pid: int) -> str:
+    """Start time of a process (field 22 of /proc/<pid>/stat, or ps's lstart); a reused pid gets a new one."""
+    try:
+        return Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        pass
+    try:
+        out = subprocess.run(["ps", "-o", "lstart=", "-p", str(int(pid))], capture_output=True, text=True).stdout
+    except (OSError, TypeError, ValueError):
+        return None
+    return out.strip() or None
+
+def _signal(pid: int, sig: int):
+    """Signals the app's process group (wrapper scripts included), or just the pid if that fails."""
+    try:
+        os.killpg(pid, sig)
+    except OSError:
+        try:
+            os.kill(pid, sig)
+        except OSError:
+            pass
+
+class WarmRunner:
+    def __init__(self, repo_root: Path, cfg: dict, output_dir: Path, file_index: FileIndex = None,
+                 verbose: bool = False):
+        self.repo_root = Path(repo_root)
+        self.cfg = cfg
+        self.wcfg = {**DEFAULTS, **(cfg.get("warm_runner", {}) or {})}
+        self.output_dir = Path(output_dir)
+        self.file_index = file_index or FileIndex(self.repo_root)
+        self.verbose = verbose
+        self.port = int(self.wcfg["port"])
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.state_path = self.output_dir / "warm_app.json"
+        self.app_log = self.output_dir / "warm_app.log"
+        self.surefire = self.repo_root / cfg.get("surefire_dir", "target/surefire-reports")
+        self.specmatic_log = self.surefire.parent / cfg.get("specmatic_log", "specmatic.log")
+
+    # ---------------- app process ------------------------------
+
+    def _state(self) -> dict:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def app_fingerprint(self) -> str:
+        self.file_index.refresh()
+        return fingerprint_inputs(self.repo_root, self.wcfg["app_inputs"],
+                                  extra=f'{self.wcfg["build_command"]}|{self.wcfg["start_command"]}|{self.port}',
+                                  index=self.file_index)
+
+    def _ready(self) -> bool:
+        try:
+            urllib.request.urlopen(self.base_url + self.wcfg["ready_path"], timeout=2).close()
+        except urllib.error.HTTPError:
+            return True  # any HTTP answer (even a 404) means the server is up
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _owned(st: dict) -> bool:
+        """The recorded pid is still the process we started (not a stale file's pid reused by something else)."""
+        pid = st.get("pid")
+        return bool(st.get("identity")) and _alive(pid) and _identity(pid) == st["identity"]
+
+    def status(self) -> dict:
+        st = self._state()
+        return {**st, "alive": self._owned(st) and self._ready()}
+
+    def stop(self) -> bool:
+        st = self._state()
+        self.state_path.unlink(missing_ok=True)
+        if not self._owned(st):
+            return False
+        pid = st["pid"]
+        _signal(pid, signal.SIGTERM)
+        for _ in range(100):
+            if not _alive(pid):
+                break
+            time.sleep(0.1)
+        else:
+            _signal(pid, signal.SIGKILL)
+        return True
+
+    def _build(self) -> dict:
+        print(Fore.CYAN + ">> Building the app (sources changed)..." + Style.RESET_ALL)
+        proc = subprocess.run(_args(self.wcfg["build_command"]), cwd=self.repo_root, capture_output=True, text=True)
+        return {"exit": proc.returncode, "stdout": proc.stdout, "stderr": proc.stderr}
+
+    def _start(self, fingerprint: str) -> dict:
+        jars = sorted(glob.glob(str(self.repo_root / self.wcfg["jar"])), key=os.path.getmtime)
+        if not jars:
+            return {"exit": 1, "stdout": "", "stderr": f"warm runner: no jar matches {self.wcfg['jar']}"}
+        if self._ready():
+            return {"exit": 1, "stdout": "", "stderr": f"warm runner: {self.base_url} already answers but is not "
+                    f"the app this runner started; free port {self.port} or set warm_runner.port"}
+        args = _args(self.wcfg["start_command"], jar=jars[-1], port=self.port)
+        log = open(self.app_log, "w", encoding="utf-8")
+        proc = subprocess.Popen(args, cwd=self.repo_root, stdout=log, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, start_new_session=True)
+        log.close()
+        deadline = time.time() + float(self.wcfg["start_timeout"])
+        while time.time() < deadline:
+            if proc.poll() is not None:
+                return {"exit": 1, "stdout": "", "stderr": f"warm runner: app exited with {proc.returncode}; "
+                        f"see {self.app_log}\n" + self.app_log.read_text(encoding="utf-8", errors="ignore")[-4000:]}
+            if self._ready():
+                self.state_path.write_text(json.dumps({"pid": proc.pid, "identity": _identity(proc.pid),
+                                                       "port": self.port, "fingerprint": fingerprint,
+                                                       "jar": jars[-1], "started": time.time()}), encoding="utf-8")
+                return None
+            time.sleep(0.25)
+        _signal(proc.pid, signal.SIGKILL)
+        return {"exit": 1, "stdout": "", "stderr": f"warm runner: app not ready on {self.base_url} "
+                f"after {self.wcfg['start_timeout']}s; see {self.app_log}"}
+
+    def ensure_app(self) -> dict:
+        """Starts the app, rebuilding first when its inputs changed; None when it's up, else an error result."""
+        fingerprint = self.app_fingerprint()
+        st = self.status()
+        if st["alive"] and st.get("fingerprint") == fingerprint:
+            if self.verbose:
+                print(f"[DEBUG] warm app pid={st['pid']} reused on {self.base_url}")
+            return None
+        t0 = time.time()
+        self.stop()
+        if st.get("fingerprint") != fingerprint or not glob.glob(str(self.repo_root / self.wcfg["jar"])):
+            built = self._build()
+            if built["exit"] != 0:
+                return built
+        err = self._start(fingerprint)
+        if err is None:
+            print(Fore.CYAN + f">> App warm on {self.base_url} ({time.time() - t0:.1f}s)" + Style.RESET_ALL)
+        return err
+
+    # ---------------- contract tests ------------------------------
+
+    def run(self, test_filter: str = "", should_stop=None, on_line=None, stdout_path: Path = None,
+            stderr_path: Path = None) -> dict:
+        """
+        One contract-test pass against the warm app, streamed like a `test_command` run (see
+        stream_runner.run_streaming, whose result shape it shares). The console output also becomes
+        specmatic_log.
+        """
+        stdout_path = Path(stdout_path or self.output_dir / "warm_test_stdout.txt")
+        stderr_path = Path(stderr_path or self.output_dir / "warm_test_stderr.txt")
+        # a failed build or start must not leave last run's reports to be parsed as this run's
+        self.surefire.mkdir(parents=True, exist_ok=True)
+        for old in self.surefire.glob("*.xml"):
+            old.unlink()
+        err = self.ensure_app()
+        if err is not None:
+            stdout_path.write_text(err["stdout"], encoding="utf-8")
+            stderr_path.write_text(err["stderr"], encoding="utf-8")
+            return {**err, "stopped": None}
+
+        args = _args(self.wcfg["specmatic_command"], base_url=self.base_url, reports=self.surefire,
+                     specmatic_jar=os.path.expanduser(self.wcfg["specmatic_jar"]), port=self.port)
+        # specmatic.yaml alone may name other specs than the ones `mvnw test` runs
+        args += [c for c in harness_contracts(self.repo_root, self.cfg, self.file_index) if c not in args]
+        if test_filter:
+            args.append(f"--filter={test_filter}")
+        env = {**os.environ, **{k: str(v) for k, v in (self.wcfg.get("env") or {}).items()}}
+        result = run_streaming(args, self.repo_root, stdout_path, stderr_path, on_line=on_line,
+                               should_stop=should_stop, env=env)
+        if stdout_path.exists():
+            shutil.copyfile(stdout_path, self.specmatic_log)
+        return result
+
+def from_config(cfg: dict, repo_root: Path, output_dir: Path, file_index: FileIndex = None,
+                verbose: bool = False) -> WarmRunner:
+    return WarmRunner(repo_root, cfg, output_dir, file_index, verbose)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--status", action="store_true", help="Show the warm app's pid/port/liveness")
+    ap.add_argument("--stop", action="store_true", help="Stop the warm app")
+    ap.add_argument("--filter", default="", help="Specmatic filter expression, e.g. METHOD='POST' && PATH='/payments'")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+    root = Path(cfg.get("repo_root", "../../")).resolve()
+    out = root / cfg.get("output_dir", ".agentic")
+    out.mkdir(parents=True, exist_ok=True)
+    fi = FileIndex(root, out / "file_index.json")
+    runner = from_config(cfg, root, out, fi, args.verbose)
+    if args.status:
+        print(json.dumps(runner.status(), indent=2))
+        return 0
+    if args.stop:
+        print("stopped" if runner.stop() else "not running")
+        return 0
+    res = runner.run(args.filter)
+    fi.save()
+    sys.stdout.write(tail(runner.output_dir / "warm_test_stdout.txt"))
+    sys.stderr.write(res["stderr"])
+    return res["exit"]
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+`run.py --watch`: re-run the agent when the service's sources, OpenAPI specs or specmatic.yaml change.
+
+Uses Linux inotify through ctypes (no extra dependency), falling back to mtime polling elsewhere.
+Bursts of saves are debounced into one pass; a change that lands while a pass is running
+cancels it (in-flight LLM generations are dropped) and starts a fresh pass on the new state.
+Only one watcher per output dir: a second one exits instead of competing for the same Ollama.
+"""
+import ctypes, ctypes.util, os, select, struct, sys, threading, time
+from pathlib import Path
+from colorama import Fore, Style
+from repo_utils import IGNORE_DIRS, walk_files
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_ISDIR, IN_CLOEXEC = 0x40000000, 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct("iIII")
+
+def _is_noise(name: str) -> bool:
+    """Editor swap/backup files."""
+    return name.endswith(("~", ".swp", ".swx", ".tmp")) or name.startswith(".#") or name == "4913"
+
+class _Inotify:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}  # wd -> dir Path
+
+    def add_dir(self, path: Path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), WATCH_MASK)
+        if wd >= 0:
+            self.dirs[wd] = path
+
+    def add_tree(self, path: Path):
+        self.add_dir(path)
+        for dirpath, dirnames, _ in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d not in IGNORE_DIRS]
+            for d in dirnames:
+                self.add_dir(Path(dirpath) / d)
+
+    def read(self, timeout: float) -> list[Path]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        buf, out, i = os.read(self.fd, 64 * 1024), [], 0
+        while i + EVENT.size <= len(buf):
+            wd, mask, _, ln = EVENT.unpack_from(buf, i)
+            name = buf[i + EVENT.size:i + EVENT.size + ln].rstrip(b"\0").decode("utf-8", "ignore")
+            i += EVENT.size + ln
+            base = self.dirs.get(wd)
+            if base is None or not name or _is_noise(name):
+                continue
+            p = base / name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in IGNORE_DIRS:
+                    self.add_tree(p)  # new package dir: watch it (and whatever got moved in with it)
+                    out.extend(walk_files(p))
+                continue
+            out.append(p)
+        return out
+
+    def close(self):
+        os.close(self.fd)
+
+class Watcher:
+    """
+    Blocks in wait() until something under `paths` (rel to root; dirs recursively, files exactly)
+    changed and then stayed quiet for `debounce` seconds; returns the changed rel paths.
+    """
+
+    def __init__(self, root: Path, paths: list[str], debounce: float = 1.0, poll_interval: float = 0.5,
+                 use_inotify: bool = True):
+        self.root = Path(root)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.dirs = [self.root / p for p in paths if (self.root / p).is_dir()]
+        self.files = {self.root / p for p in paths if not (self.root / p).is_dir()}
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                for d in self.dirs:
+                    self._inotify.add_tree(d)
+                for f in self.files:
+                    self._inotify.add_dir(f.parent)  # editors save by rename, which drops a watch on the file
+            except (OSError, AttributeError):
+                self._inotify = None
+        self._snapshot = None if self._inotify else self._scan()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify else f"polling every {self.poll_interval}s"
+
+    def _relevant(self, p: Path) -> bool:
+        return p in self.files or any(d == p or d in p.parents for d in self.dirs)
+
+    def _scan(self) -> dict:
+        snap = {}
+        for f in [*(x for d in self.dirs for x in walk_files(d)), *self.files]:
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            snap[f] = (st.st_mtime, st.st_size)
+        return snap
+
+    def _events(self, timeout: float) -> set[Path]:
+        if self._inotify:
+            return {p for p in self._inotify.read(timeout) if self._relevant(p)}
+        time.sleep(timeout)
+        snap = self._scan()
+        old, self._snapshot = self._snapshot, snap
+        return {p for p in set(old) | set(snap) if old.get(p) != snap.get(p)}
+
+    def wait(self, stop: threading.Event = None) -> set[str]:
+        changed, last = set(), 0.0
+        while not (stop and stop.is_set()):
+            events = self._events(min(self.poll_interval, self.debounce))
+            if events:
+                changed |= events
+                last = time.time()
+            elif changed and time.time() - last >= self.debounce:
+                return {p.relative_to(self.root).as_posix() for p in changed}
+        return set()
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+
+def _single_watcher_lock(output_dir: Path):
+    """Exclusive lock on output_dir/watch.lock for the life of the process (None if already held)."""
+    fh = open(output_dir / "watch.lock", "a+")
+    try:
+        import fcntl
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        pass  # no flock (Windows): skip the guard
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+def run_watch(agent, propose_patches: bool = False, run_first: bool = True) -> int:
+    from agent import Cancelled
+
+    wcfg = agent.cfg.get("watch", {}) or {}
+    paths = wcfg.get("paths") or ["src/main/java", "src/main/resources/openapi",
+                                  agent.cfg.get("specmatic_config", "specmatic.yaml")]
+    lock = _single_watcher_lock(agent.output_dir)
+    if lock is None:
+        print(Fore.RED + f">> Another --watch is already running for {agent.output_dir}" + Style.RESET_ALL)
+        return 1
+
+    watcher = Watcher(agent.repo_root, paths, debounce=float(wcfg.get("debounce", 1.0)),
+                      poll_interval=float(wcfg.get("poll_interval", 0.5)),
+                      use_inotify=bool(wcfg.get("inotify", True)))
+    agent.cancellable = True
+    print(Fore.CYAN + f">> Watching {', '.join(paths)} ({watcher.mode}); Ctrl-C to stop" + Style.RESET_ALL)
+
+    def one_pass(reason: str):
+        t0 = time.time()
+        print(Fore.MAGENTA + f"== Agent pass ({reason}) ==" + Style.RESET_ALL)
+        try:
+            result = agent.run_once(propose_patches=propose_patches)
+        except Cancelled:
+            print(Fore.YELLOW + f">> Pass cancelled after {time.time()-t0:.1f}s: inputs changed" + Style.RESET_ALL)
+            return
+        except Exception as e:
+            print(Fore.RED + f">> Pass failed: {type(e).__name__}: {e}" + Style.RESET_ALL)
+            return
+        print(Fore.GREEN + f">> Pass done in {time.time()-t0:.1f}s: tests "
+              f"{'passed' if result['testsPassed'] else 'failed'}, {result['failureCount']} failure(s), "
+              f"{result['proposedPatchCount']} patch(es); artifacts in {agent.output_dir}" + Style.RESET_ALL)
+
+    worker = None
+    def start(reason: str):
+        nonlocal worker
+        if worker and worker.is_alive():
+            agent.cancel_event.set()
+            worker.join()
+        agent.cancel_event.clear()
+        worker = threading.Thread(target=one_pass, args=(reason,), name="agent-pass", daemon=True)
+        worker.start()
+
+    try:
+        if run_first:
+            start("startup")
+        while True:
+            changed = watcher.wait()
+            shown = ", ".join(sorted(changed)[:3]) + (f" +{len(changed) - 3} more" if len(changed) > 3 else "")
+            start(f"changed: {shown}")
+    except KeyboardInterrupt:
+        agent.cancel_event.set()
+        if worker:
+            worker.join(timeout=10)
+    finally:
+        watcher.close()
+        lock.close()
+    return 0